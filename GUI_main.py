@@ -20,6 +20,7 @@ import threading
 
 CAM_MAX_EXPOSURE = 20000  # Maximum exposure value
 CAM_MAX_BRIGHTNESS = 100.0  # Maximum brightness value
+AUTO_CALIBRATE_POLL = 100  # Milliseconds between checks for the auto exposure to finish
 
 
 class Main_Window():
@@ -144,10 +145,12 @@ class Main_Window():
         # Create and pack secondary frames
         sec_frame_filter = tk.Frame(self.frame_settings)
         sec_frame_corners = tk.Frame(self.frame_settings)
+        sec_frame_lens = tk.Frame(self.frame_settings)
         sec_frame_camera = tk.Frame(self.frame_settings)
         sec_frame_pid = tk.Frame(self.frame_settings)
         sec_frame_filter.pack(side="left", padx=5, fill="x", expand=True)
         sec_frame_corners.pack(side="left", padx=5, fill="x", expand=True)
+        sec_frame_lens.pack(side="left", padx=5, fill="x", expand=True)
         sec_frame_camera.pack(side="left", padx=5, fill="x", expand=True)
         sec_frame_pid.pack(side="left", padx=5, fill="x", expand=True)
 
@@ -166,6 +169,12 @@ class Main_Window():
                                             width=12, height=2)
         corners_button.pack()
 
+        # Lens Button
+        lens_button = tk.Button(sec_frame_lens, text="Lens",
+                                            command=self.app.calibrate_lens,  font=('system', 14)
+                                           , fg="sea green",
+                                            width=12, height=2)
+        lens_button.pack()
 
         # Camera Button
         camera_button = tk.Button(sec_frame_camera, text="Camera",
@@ -191,9 +200,11 @@ class Main_Window():
         sec_frame_mazefeed = tk.Frame(self.frame_tests)
         sec_frame_livefeed = tk.Frame(self.frame_tests)
         sec_frame_spherofeed = tk.Frame(self.frame_tests)
+        sec_frame_record = tk.Frame(self.frame_tests)
         sec_frame_mazefeed.pack(side="left", padx=5, fill="x", expand=True)
         sec_frame_livefeed.pack(side="left", padx=5, fill="x", expand=True)
         sec_frame_spherofeed.pack(side="left", padx=5, fill="x", expand=True)
+        sec_frame_record.pack(side="left", padx=5, fill="x", expand=True)
 
         # Live Feed Button
         live_feed_button = tk.Button(sec_frame_livefeed, text="Live Feed",
@@ -219,6 +230,14 @@ class Main_Window():
 
         sphero_feed_button.pack()
 
+        # Record Button (starts/stops recording camera frames for replay)
+        record_button = tk.Button(sec_frame_record, text="Record",
+                                            command=self.app.toggle_recording,  font=('system', 14)
+                                           , fg="firebrick",
+                                            width=12, height=2)
+
+        record_button.pack()
+
     def pack_maze(self):
         # Create and pack secondary frames
         sec_frame_maze_info = tk.Frame(self.frame_maze_settings)
@@ -295,6 +314,7 @@ class Calibrate_Window():
 
         # Flag used for live stream
         self.adjusting = True
+        self.auto_thread = None  # Auto exposure thread, set while it runs
 
         # Set incrementer for brightness and exposure (OS dependent)
         if self.maze_camera.OS == 'Windows':
@@ -309,6 +329,7 @@ class Calibrate_Window():
         # Pack each of the setting interfaces
         self.exposure_pack()
         self.brightness_pack()
+        self.auto_button_pack()
         # Pack the quit button
         self.quit_button_pack()
 
@@ -317,6 +338,7 @@ class Calibrate_Window():
         #print("Init Frames")
         self.frame_exposure = tk.Frame(self.master)
         self.frame_brightness = tk.Frame(self.master)
+        self.frame_auto = tk.Frame(self.master)
         self.frame_quit = tk.Frame(self.master)
 
     # Pack each frame
@@ -324,6 +346,7 @@ class Calibrate_Window():
         #print("Pack Frames")
         self.frame_exposure.pack(side="top",fill="x", expand=True)
         self.frame_brightness.pack(side="top",fill="x", expand=True)
+        self.frame_auto.pack(side="top",fill="x", expand=True)
         self.frame_quit.pack(side="bottom",fill="x", expand=True)
 
     # Exposure frames, buttons, and variables
@@ -384,6 +407,12 @@ class Calibrate_Window():
         #Initialize Brightness Value
         self.brightness_value.set(self.setting_brightness)
 
+    # Auto button, sets the exposure and brightness from the image of the maze board
+    def auto_button_pack(self):
+        self.autoButton = tk.Button(self.frame_auto, text="Auto", font=('Arial', 16), fg="blue",
+                                    command=self.__auto_calibrate, borderwidth=3)
+        self.autoButton.pack(side="top",fill="x",expand=True,padx=3)
+
     def quit_button_pack(self):
         # Quit Button
         #print("Pack Quit")
@@ -438,6 +467,28 @@ class Calibrate_Window():
 
         return self.maze_camera.cam_brightness_value  # Return value
 
+    # Runs the camera auto exposure in its own thread (each step waits for camera frames, which would freeze the GUI)
+    def __auto_calibrate(self):
+        if self.auto_thread is not None:
+            return  # Already running
+        self.autoButton.configure(state="disabled")
+        self.auto_thread = threading.Thread(target=self.maze_camera.auto_calibrate_exposure, name="Auto Exposure")
+        self.auto_thread.daemon = True
+        self.auto_thread.start()
+        self.master.after(AUTO_CALIBRATE_POLL, self.__auto_calibrate_done)
+
+    # Checked from the GUI thread until the auto exposure has finished, then shows the values it settled on
+    def __auto_calibrate_done(self):
+        if not self.adjusting:
+            return  # Window closed
+        if self.auto_thread.is_alive():
+            self.master.after(AUTO_CALIBRATE_POLL, self.__auto_calibrate_done)
+            return
+        self.auto_thread = None
+        self.autoButton.configure(state="normal")
+        self.exposure_value.set(self.maze_camera.cam_exposure_value)
+        self.brightness_value.set(self.maze_camera.cam_brightness_value)
+
     def close_windows(self):
         self.maze_camera.save_cam_settings()
         #print("Saving Camera Settings")
@@ -0,0 +1,186 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Benchmark
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Replays a camera recording through the camera and solver code
+# 2.  Benchmarks the camera capture modes
+# 3.  Compares the Sphero detectors
+
+# Imports
+import sys
+import time
+import json
+import numpy as np
+from camera_main import Maze_Camera
+from solver import Maze_Solver
+from sphero_tracker import Sphero_Tracker, LED_Detector, DETECTION_FRESH, DETECTION_PREDICTED, DETECTION_STALE
+
+#####################################################################
+# The purpose of this code is to benchmark and regression test the
+# vision and solver code without the maze hardware.  A recording made
+# with the Record button (or Maze_Camera.start_recording) is played
+# back as fast as possible, every frame is solved, and the time taken
+# per frame is reported.  The results can be saved and compared with
+# a later run to check that a change did not alter what the maze sees.
+#
+# Usage: python3 benchmark.py <recording> [results file]
+# If the results file exists the run is compared with it, otherwise
+# the results are written to it.
+#
+# Usage: python3 benchmark.py --capture-modes
+# Times the camera capture modes and saves the fastest one that still
+# gives the maze board enough pixels to captureSettings.txt.
+#
+# Usage: python3 benchmark.py --detectors <recording>
+# Times the circle (Hough) and LED colour Sphero detectors on every
+# frame of a recording made with the Sphero LED lit, and reports how
+# often each found the Sphero and how far apart their positions are.
+#####################################################################
+
+# Runs every frame of a recording through the solver.
+# Returns a list of per frame results and a list of per frame times (seconds)
+def benchmark_solver(recording, max_frames=None):
+    camera = Maze_Camera(replay=recording, realtime=False)
+    solver = Maze_Solver(camera)
+    results = []
+    timings = []
+
+    while max_frames is None or len(results) < max_frames:
+        frame = camera.get_frame_context()
+        if frame is None:
+            break  # End of the recording
+
+        start = time.perf_counter()
+        try:
+            checkpoints = [int(c) for c in solver.solveMaze(frame)]
+        except Exception:
+            checkpoints = None  # Unsolvable maze
+        coordinates = solver.getSpheroCorodinates(frame)
+        timings.append(time.perf_counter() - start)
+
+        results.append({'frame': len(results),
+                        'capture_time': frame.capture_time,
+                        'sphero': [round(float(c), 1) for c in coordinates[:2]],
+                        'source': coordinates.source,
+                        'confidence': round(coordinates.confidence, 2),
+                        'checkpoints': checkpoints})
+
+    camera.close_camera()
+    solver.tracker.print_report()
+    solver.endpoint.print_report()
+    return results, timings
+
+# Runs both Sphero detectors on every frame of a recording.
+# Returns a dictionary of per frame times (seconds) and positions ((x, y) or None) by detector name
+def benchmark_detectors(recording, max_frames=None):
+    camera = Maze_Camera(replay=recording, realtime=False)
+    detectors = {'hough': Sphero_Tracker(), 'led': LED_Detector()}
+    timings = {name: [] for name in detectors}
+    positions = {name: [] for name in detectors}
+    frames = 0
+
+    while max_frames is None or frames < max_frames:
+        frame = camera.get_frame_context()
+        if frame is None:
+            break  # End of the recording
+        frame.image()  # Warp the frame before timing, both detectors start from the maze image
+        frames += 1
+        for name, detector in detectors.items():
+            start = time.perf_counter()
+            circles = detector.find(frame)
+            timings[name].append(time.perf_counter() - start)
+            if circles is not None and len(circles[0]) == 1:
+                positions[name].append((float(circles[0][0][0]), float(circles[0][0][1])))
+            else:
+                positions[name].append(None)
+
+    camera.close_camera()
+    return timings, positions
+
+# Prints the timings of each detector, how often each found the Sphero and how well they agree
+def print_detector_comparison(timings, positions):
+    for name in sorted(timings):
+        print_timings(name, timings[name])
+        found = sum(p is not None for p in positions[name])
+        print("{}: found the Sphero in {} of {} frames".format(name, found, len(positions[name])))
+    distances = [np.hypot(a[0] - b[0], a[1] - b[1]) for a, b in zip(positions['hough'], positions['led'])
+                 if a is not None and b is not None]
+    if distances:
+        print("hough vs led: {} frames found by both, distance mean {:.2f} px, 95% {:.2f} px, max {:.2f} px".format(
+            len(distances), np.mean(distances), np.percentile(distances, 95), np.max(distances)))
+
+# Prints how often the Sphero was found, predicted or not known in a list of results, and the detection confidence
+def print_detection_quality(results):
+    if len(results) == 0:
+        return
+    for source in (DETECTION_FRESH, DETECTION_PREDICTED, DETECTION_STALE):
+        confidences = [r['confidence'] for r in results if r.get('source') == source]
+        if confidences:
+            print("Sphero {}: {} of {} frames, confidence mean {:.2f}, 5% {:.2f}".format(
+                source, len(confidences), len(results), np.mean(confidences), np.percentile(confidences, 5)))
+
+# Prints a summary of a list of times (seconds)
+def print_timings(name, timings):
+    if len(timings) == 0:
+        print(name + ": no frames")
+        return
+    ms = np.array(timings) * 1000
+    print("{}: {} frames, mean {:.2f} ms, median {:.2f} ms, 95% {:.2f} ms, max {:.2f} ms".format(
+        name, len(ms), ms.mean(), np.median(ms), np.percentile(ms, 95), ms.max()))
+
+# Compares two lists of results, returns the number of frames that differ
+def compare_results(expected, actual):
+    differences = 0
+    if len(expected) != len(actual):
+        print("Frame count changed:", len(expected), "->", len(actual))
+    for old, new in zip(expected, actual):
+        if old['checkpoints'] != new['checkpoints'] or \
+                np.hypot(old['sphero'][0] - new['sphero'][0], old['sphero'][1] - new['sphero'][1]) > 2:
+            differences += 1
+            print("Frame", new['frame'], "changed:", old, "->", new)
+    return differences
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 benchmark.py <recording> [results file]")
+        print("       python3 benchmark.py --capture-modes")
+        print("       python3 benchmark.py --detectors <recording>")
+        return
+
+    if sys.argv[1] == '--capture-modes':
+        camera = Maze_Camera()
+        camera.benchmark_capture_modes()
+        camera.close_camera()
+        return
+
+    if sys.argv[1] == '--detectors' and len(sys.argv) > 2:
+        timings, positions = benchmark_detectors(sys.argv[2])
+        print_detector_comparison(timings, positions)
+        return
+
+    results, timings = benchmark_solver(sys.argv[1])
+    print_timings("Camera + solver", timings)
+    print_detection_quality(results)
+
+    if len(sys.argv) > 2:
+        try:
+            with open(sys.argv[2]) as f:
+                expected = json.load(f)
+        except (IOError, ValueError):
+            with open(sys.argv[2], "w") as f:
+                json.dump(results, f)
+            print("Saved results to", sys.argv[2])
+        else:
+            differences = compare_results(expected, results)
+            print(differences, "of", len(results), "frames differ from", sys.argv[2])
+
+if __name__ == '__main__':
+    main()
@@ -19,17 +19,30 @@ import time
 import numpy as np
 import json
 import os
+import threading
+from frame_sources import Frame_Recorder, Replay_Capture, Image_Source
+from maze_geometry import Maze_Geometry
 
 # Support Macros
 CAMERA_NUMBER = 0  # The camera number indicates which camera is being used; default value is 0.
 PARAMETERS_FILE = "parameters.txt"  # Name of the file that stores threshold values
 CORNERS_FILE = "corners.txt"
+LENS_CALIBRATION_FILE = "lensCalibration.txt"  # Camera matrix and lens distortion from the chessboard calibration
 CAMERA_SETTINGS_FILE = "camSettings.txt"
+CAPTURE_SETTINGS_FILE = "captureSettings.txt"  # Capture resolution, pixel format (FOURCC) and frame rate
 CAM_MAX_EXPOSURE = 20000  # Maximum exposure value
 CAM_MAX_BRIGHTNESS = 100.0  # Maximum brightness value
 CAM_INITIAL_BRIGHTNESS = 100  # The brightness will be set to this value upon initialization
 CAM_INITIAL_EXPOSURE = 10  # The exposure will be set to this value upon initialization
 
+# Capture format, used if captureSettings.txt is missing.  A width/height of None keeps the camera's default resolution.
+# MJPEG lets USB webcams send full frame rates at higher resolutions than uncompressed YUYV.
+CAPTURE_DEFAULTS = {'width': None, 'height': None, 'fourcc': 'MJPG', 'fps': 30}
+# Capture modes (width, height, FOURCC, fps) tried by benchmark_capture_modes
+CAPTURE_BENCHMARK_MODES = [(640, 480, 'MJPG', 30), (800, 600, 'MJPG', 30), (1280, 720, 'MJPG', 30),
+                           (1920, 1080, 'MJPG', 30), (640, 480, 'YUYV', 30), (1280, 720, 'YUYV', 30)]
+CAPTURE_BENCHMARK_FRAMES = 60  # Frames timed for each capture mode
+
 # Linux Camera Parameters
 CAM_MAX_EXPOSURE_LINUX = 200  # Maximum exposure value
 CAM_MAX_BRIGHTNESS_LINUX = 100.0  # Maximum brightness value
@@ -45,22 +58,55 @@ CAM_MIN_BRIGHTNESS_WIN = 0  # Minimum brightness value
 CAM_INITIAL_BRIGHTNESS_WIN = 25  # The brightness will be set to this value upon initialization
 CAM_INITIAL_EXPOSURE_WIN = -10  # The exposure will be set to this value upon initialization
 
-PERSPECTIVE_WIDTH = 560		#Pixel Width
-PERSPECTIVE_HEIGHT = 240	#Pixel Height
+AUTO_EXPOSURE_TARGET = 120  # Mean grey level (0-255) of the maze board that auto exposure aims for
+AUTO_EXPOSURE_TOLERANCE = 10  # Auto exposure has converged when the board mean is this close to the target
+AUTO_EXPOSURE_CLIPPED = 0.02  # Largest fraction of blown out board pixels (grey level 250 and up) allowed
+AUTO_EXPOSURE_MAX_STEPS = 8  # Most setting changes made by one auto exposure run
+AUTO_EXPOSURE_SETTLE_FRAMES = 2  # Frames skipped after a setting change, the camera takes a frame or two to apply it
+AUTO_EXPOSURE_INTERVAL = 10.0  # Seconds between runs of the background auto exposure
+
 kernel = np.ones((3,3),np.uint8)  #### What does this do?  ####
-NOCAM_IMG = 'testImage.jpg'
+CHESSBOARD_SIZE = (9, 6)  # Inner corners (columns, rows) of the printed chessboard used for lens calibration
+LENS_CALIBRATION_VIEWS = 15  # Chessboard views collected for a lens calibration
+CORNER_DETECT_WIDTH = 640  # Camera images are shrunk to this width before looking for the maze board
+CORNER_MIN_AREA = 0.1  # Smallest fraction of the camera image the maze board can cover
+CORNER_DRIFT_TOLERANCE = 3.0  # Corner movement (pixels of the shrunk image) that counts as the board having moved
+CORNER_TRACK_CONFIRMATIONS = 2  # Checks in a row that must agree on the new corners before they are used
+CORNER_TRACK_INTERVAL = 2.0  # Seconds between checks of the background corner tracker
+BACKGROUND_RATE = 0.05  # Weight of each frame in the background model where the board looks unchanged
+BACKGROUND_FOREGROUND_RATE = 0.005  # Weight where it differs, so a wall left in a new place fades in over ~7 seconds
+BACKGROUND_THRESHOLD = 25  # Grey level difference from the background model that makes a pixel foreground
+BACKGROUND_WARMUP = 15  # Frames a new background model is made from (their median, so the Sphero is left out)
+BACKGROUND_MAX_FRACTION = 0.5  # If more of the board than this is foreground the lighting changed, start again
+BACKGROUND_MIN_AREA = 30  # Smallest foreground blob (pixels of the maze image) that is kept
+NOCAM_IMG = 'testImage.jpg'  # Image (or list of images) used in no camera mode
+NOCAM_CACHE = None  # Set to a .npy file name to keep the decoded no camera images between runs
 
 #####################################################################
 # The purpose of this code is to provide an interface for the maze
 # code to interact with the camera. This code will handle the camera
 # object, camera settings, and filter settings. This code will also
 # handle functionality for corner coordinates.
+#
+# A running average of the maze image is kept as a model of the
+# empty board.  Anything that differs from it (the Sphero, a hand
+# moving a wall) is foreground, found with one frame difference, so
+# the Sphero can be looked for in a few small areas instead of the
+# whole board.  Where the board looks unchanged the model follows the
+# lighting quickly; where it differs it follows slowly, so the Sphero
+# does not fade into it but a moved wall does in time.
 #####################################################################
 
 # This class will handle the camera and the filters
+# replay is the file name of a recording to play back instead of using the camera.  realtime is a bool flag, if true the
+# recording is played at its original speed, otherwise every frame is handed out in order as fast as it is asked for.
+# geometry is the Maze_Geometry of the maze, if None it is loaded from mazeGeometry.txt (the standard maze if none).
 class Maze_Camera():
-    def __init__(self, nocam = False):
+    def __init__(self, nocam = False, replay = None, realtime = True, geometry = None):
         self.noCam = nocam # Flag for no camera debug mode
+        self.replay = replay  # Recording played back in place of the camera (None to use the camera)
+        self.replay_realtime = realtime  # Flag is true if the recording is played at its original speed
+        self.geometry = geometry if geometry is not None else Maze_Geometry.load()  # Maze grid and maze image size
 
         # Camera Parameters (Initialized to LINUX values, later changed by check_OS function)
         self.cam_brightness_init = CAM_INITIAL_BRIGHTNESS  # Holds current brightness value
@@ -74,9 +120,42 @@ class Maze_Camera():
         # CAMERA
         self.camera_open = False  # Flag is true if the camera is open
         self.camera_setup = False # Flag is true if the camera settings have been configured (brightness, exposure, etc)
-        if not self.noCam:
+        self.cap = None  # Camera object (video capture)
+        self.capture_format = {}  # Resolution, FOURCC and frame rate the camera actually runs at
+        self.cap_lock = threading.Lock()  # Guards the camera object between the capture thread and the settings
+
+        # Latest frame slot (filled by the capture thread)
+        self.frame_seq = 0  # Sequence number of the newest frame
+        self.frame_time = 0  # Capture timestamp (time.time()) of the newest frame
+        self.__frame_read_time = 0  # time.time() the newest frame was read, for a recording played as fast as possible
+        self.__latest_frame = None  # Newest frame from the camera
+        self.__frame_ready = threading.Condition()  # Notified every time a new frame is published
+        self.__grabbing = False  # Flag is true while the capture thread should keep running
+        self.__grab_thread = None
+        self.__recorder = None  # Frame recorder, set while frames are being recorded
+        self.__auto_exposure_thread = None  # Background auto exposure thread
+        self.__auto_exposure_stop = threading.Event()  # Set to stop the background auto exposure
+        self.__corner_thread = None  # Background corner tracking thread
+        self.__corner_stop = threading.Event()  # Set to stop the background corner tracking
+        self.__corner_candidate = None  # Moved corners seen by the tracker, waiting to be confirmed
+        self.__corner_confirmations = 0  # Number of checks in a row that saw the candidate corners
+        self.__background = None  # Running average (float grey levels) of the maze image, None while warming up
+        self.__background_warmup = []  # Frames collected for a new background model
+        self.__background_seq = 0  # Sequence number of the last frame averaged in (each frame is added once)
+        self.__background_lock = threading.Lock()  # Frames can come from the controller and the GUI threads
+
+        if self.replay is not None and not self.noCam:
+            self.cap = Replay_Capture(self.replay, realtime)  # Play back a recording in place of the camera
+            self.camera_open = self.cap.isOpened()
+            self.__setup_camera()  # Settings are kept but do not change a recording
+            if realtime:
+                self.__start_grabber()  # Frames are published as they come due, like a live camera
+        elif self.noCam:
+            self.cap = Image_Source(NOCAM_IMG, NOCAM_CACHE)  # Decoded once and served from memory
+        else:
             self.cap = self.__open_camera()  # Open and collect camera object
             self.__setup_camera()  # Set up the camera settings
+            self.__start_grabber()  # Start draining the camera in the background
 
         # FILTERS
         # Initialize the thresholds for walls, corners, and endPoints
@@ -87,12 +166,27 @@ class Maze_Camera():
         self.__init_thresholds()  # Set values for thresholds
 
         # Corners
-        #self.corners = [] # This will hold the coordinates of each corner
-        #self.corners_set = False  # Flag is true if corners have been set
-        #self.maze_ROI = {'row1': 0}  # Maze Region of Interest (ROI)
+        self.corners = [] # This will hold the coordinates of each corner
+        self.corners_set = False  # Flag is true if corners have been set
+        self.maze_ROI = {}  # Maze Region of Interest (ROI)
+        self.__warp_maps = None  # Remap tables for the corner transformation, rebuilt only when the corners change
+        self.__corners_lock = threading.Lock()  # Guards the corners and remap tables against the corner tracker
+        self.corners_resolution = None  # Capture resolution [width, height] the corners were picked at
+        self.lens = None  # Camera matrix, distortion and resolution from the lens calibration (None: not calibrated)
+        self.__load_lens_calibration()
         self.__load_corners() #Loads Corners from file
+        if not self.corners_set:
+            self.auto_set_corners()  # No saved corners, look for the board
 
     def __del__(self):
+        self.close_camera()
+
+    # Stops the capture thread and closes the camera
+    def close_camera(self):
+        self.stop_corner_tracking()
+        self.stop_auto_exposure()
+        self.__stop_grabber()
+        self.stop_recording()
         # Try to close the camera
         try:
             if self.cap:
@@ -110,6 +204,7 @@ class Maze_Camera():
     class Threshold():
         def __init__(self,threshold_name):
             self.name = threshold_name  # Identifying name
+            self.update_bounds()
         # HSV values
         H_MIN = 0
         H_MAX = 256
@@ -118,6 +213,78 @@ class Maze_Camera():
         V_MIN = 0
         V_MAX = 256
 
+        # Rebuilds the inRange bounds from the HSV values (call after changing them)
+        def update_bounds(self):
+            self.lower = np.array([self.H_MIN, self.S_MIN, self.V_MIN])
+            self.upper = np.array([self.H_MAX, self.S_MAX, self.V_MAX])
+
+# ------------------------------------- Frame Context Class -----------------------------------------------------------#
+    # Wraps one captured frame and makes the images derived from it (transformed maze image, grayscale, HSV,
+    # walls, endpoint, foreground, and anything a consumer asks for such as the Sphero detection) only when they are
+    # first asked for.  Each product is kept for the life of the frame, so every consumer in a control tick shares the
+    # work and products nobody asks for cost nothing.
+    class FrameContext():
+        def __init__(self, camera, raw, seq, capture_time, transform=True):
+            self.camera = camera  # Maze camera that captured the frame (owns the corners and thresholds)
+            self.raw = raw  # Raw image as read from the camera
+            self.seq = seq  # Sequence number of the frame
+            self.capture_time = capture_time  # Time (time.time()) the frame was captured
+            self.transform = transform  # If true the products are made from the transformed maze image
+            self.__products = {}  # Products made so far, by name
+            self.clock_offset = camera.clock_offset()  # Frame timebase minus time.time() (see Maze_Camera.now)
+            # Time the frame reached each stage of the control loop (see latency.LATENCY_STAGES)
+            self.stamps = {'capture': capture_time, 'acquired': time.time() + self.clock_offset}
+
+        # Stamp the time the frame reached a stage (only the first time)
+        def mark(self, stage):
+            if stage not in self.stamps:
+                self.stamps[stage] = time.time() + self.clock_offset
+
+        # Returns the product called name, calling compute() to make it if it has not been made for this frame yet
+        def product(self, name, compute):
+            if name not in self.__products:
+                self.__products[name] = compute()
+            return self.__products[name]
+
+        # Returns the maze image (transformed based on the corners), or the raw image if no transform was requested
+        def image(self):
+            if not self.transform:
+                return self.raw
+            return self.product('image', lambda: self.camera._transform_image(self.raw))
+
+        # Returns the grayscale version of the image
+        def gray(self):
+            return self.product('gray', lambda: cv2.cvtColor(self.image(), cv2.COLOR_BGR2GRAY))
+
+        # Returns the HSV version of the image
+        def hsv(self):
+            return self.product('hsv', lambda: cv2.cvtColor(self.image(), cv2.COLOR_BGR2HSV))
+
+        # Returns the image filtered with the threshold values for the walls
+        def walls(self):
+            return self.product('walls', lambda: self.camera._filter_image(self.hsv(), self.camera.wallsThreshold))
+
+        # Returns the image filtered with the threshold values for the endpoint
+        def endpoint(self):
+            return self.product('endpoint',
+                                lambda: self.camera._filter_image(self.hsv(), self.camera.endPointThreshold))
+
+        # Returns the endpoint image of part of the maze image (columns x0 to x1, rows y0 to y1), not kept
+        def endpoint_window(self, x0, y0, x1, y1):
+            return self.camera._filter_image(self.hsv()[y0:y1, x0:x1], self.camera.endPointThreshold)
+
+        # Returns the foreground image (255 where the maze image differs from the background model), or None while
+        # there is no background model yet
+        def foreground(self):
+            if not self.transform:
+                return  # The background model is of the maze image
+            return self.product('foreground', lambda: self.camera._foreground_mask(self.gray(), self.seq))
+
+        # Returns the bounding boxes (x, y, width, height) of the foreground blobs, largest first, or None while there
+        # is no background model yet
+        def foreground_blobs(self):
+            return self.product('foreground_blobs', lambda: self.camera._foreground_blobs(self.foreground()))
+
 # ------------------------------------- Camera Setup ------------------------------------------------------------------#
     # Open camera will open up and return a camera object(video capture).
     def __open_camera(self):
@@ -146,6 +313,10 @@ class Maze_Camera():
         # Apply exposure and brightness values to camera
         if self.camera_open:
             try:
+                if self.replay is None:
+                    self.__load_capture_settings()
+                    self.__apply_capture_format(self.capture_settings)  # Must come before the other settings
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short, the capture thread drains it
                 self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.25)  # This is needed in Linux to allow changes in exposure
                 self.__load_cam_settings()
                 # Windows
@@ -162,28 +333,246 @@ class Maze_Camera():
             except:
                 print("Maze Camera Error:  Failed to setup camera")
 
+# ---------------------------------------- Capture Format -------------------------------------------------------------#
+    # Asks the camera for a capture format (dict with width, height, fourcc and fps; None values are left alone) and
+    # reads back what the camera actually gave
+    def __apply_capture_format(self, settings):
+        if settings.get('fourcc'):
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings['fourcc']))
+        if settings.get('width') and settings.get('height'):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings['width'])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings['height'])
+        if settings.get('fps'):
+            self.cap.set(cv2.CAP_PROP_FPS, settings['fps'])
+        self.__read_capture_format()
+
+    # Reads the capture format the camera is running at into capture_format
+    def __read_capture_format(self):
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.capture_format = {'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                               'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                               'fourcc': "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)),
+                               'fps': self.cap.get(cv2.CAP_PROP_FPS)}
+        print("Maze Camera: Capture format:", self.capture_format)
+
+    # Returns the capture format the camera is running at (width, height, fourcc, fps)
+    def get_capture_format(self):
+        return dict(self.capture_format)
+
+    # This function will read in the capture format from a text file
+    def __load_capture_settings(self):
+        self.capture_settings = dict(CAPTURE_DEFAULTS)
+        try:
+            with open(CAPTURE_SETTINGS_FILE) as f:
+                self.capture_settings.update(json.load(f))
+            print("Maze Camera: Loading capture format from file: ", self.capture_settings)
+        except:
+            print("Maze Camera: Unable to load capture format from captureSettings.txt, using defaults.")
+
+    # This function will write the requested capture format to a text file
+    def save_capture_settings(self):
+        print("Maze Camera: Saving capture format to file")
+        with open(CAPTURE_SETTINGS_FILE, "w") as f:
+            json.dump(self.capture_settings, f)
+
+    # Number of camera pixels the maze board covers at a capture resolution (None if the corners are not set)
+    def __board_pixels(self, width, height):
+        if not self.corners_set:
+            return None
+        scale_x, scale_y = self.__corners_scale(width, height)
+        quad = [self.corners[i] for i in (0, 1, 3, 2)]  # Trace the corners around the board
+        quad = np.array([[x / scale_x, y / scale_y] for x, y in quad], np.float32)
+        return cv2.contourArea(quad)
+
+    # Times each capture mode and keeps the fastest one that still gives the board at least as many camera pixels as
+    # the transformed maze image has (if no mode does, the fastest of the modes with the most board pixels is kept).
+    # The chosen mode is applied and saved.  Returns a list of results, one per mode.
+    def benchmark_capture_modes(self, modes=CAPTURE_BENCHMARK_MODES, frames=CAPTURE_BENCHMARK_FRAMES):
+        if self.noCam or self.replay is not None or not self.camera_open:
+            print("Maze Camera: Capture benchmark error: camera not open")
+            return []
+
+        self.__stop_grabber()  # The benchmark reads the camera directly
+        results = []
+        for width, height, fourcc, fps in modes:
+            settings = {'width': width, 'height': height, 'fourcc': fourcc, 'fps': fps}
+            with self.cap_lock:
+                self.__apply_capture_format(settings)
+                for i in range(5):
+                    self.cap.read()  # Let the camera settle into the new mode
+                count = 0
+                start = time.time()
+                for i in range(frames):
+                    ret, img = self.cap.read()
+                    if ret:
+                        count += 1
+                elapsed = time.time() - start
+            result = {'requested': settings, 'achieved': dict(self.capture_format),
+                      'measured_fps': count / elapsed if elapsed > 0 else 0,
+                      'board_pixels': self.__board_pixels(self.capture_format['width'],
+                                                          self.capture_format['height'])}
+            print("Maze Camera: Capture mode", result)
+            results.append(result)
+
+        needed = self.geometry.width * self.geometry.height
+        candidates = [r for r in results if r['measured_fps'] > 0 and
+                      (r['board_pixels'] is None or r['board_pixels'] >= needed)]
+        if not candidates:
+            most_pixels = max(r['board_pixels'] or 0 for r in results)
+            candidates = [r for r in results if (r['board_pixels'] or 0) == most_pixels]
+        best = max(candidates, key=lambda r: r['measured_fps'])
+        print("Maze Camera: Using capture mode", best['achieved'], "at", round(best['measured_fps'], 1), "fps")
+
+        with self.cap_lock:
+            self.capture_settings = dict(best['requested'])
+            self.__apply_capture_format(self.capture_settings)
+        self.save_capture_settings()
+        self.__start_grabber()
+        return results
+
 # -------------------- Reset functions for camera and filters ----------------------------------------------------------#
     # The reset camera function will close the camera, and then reopen the camera
     def reset_camera(self):
+        if self.replay is not None:
+            self.cap.seek(0)  # Start the recording over
+            print("Maze Camera Reset")
+            return
         try:
+            self.__stop_grabber()  # Stop reading from the camera
             self.cap.release()  # Release the camera
-            self.__open_camera()  # Open camera again
+            self.cap = self.__open_camera()  # Open camera again
             self.__setup_camera()  # Setup camera again
+            self.__start_grabber()  # Start reading from the camera again
             time.sleep(0.1)  # Pause for a moment
             print("Maze Camera Reset")
         except:
             print("Maze Camera failed to reset")
 
+# ------------------------------------- Capture Thread ----------------------------------------------------------------#
+    # Starts the capture thread.  The thread reads the camera as fast as it delivers frames so the driver buffer never
+    # fills with old frames, and only the newest frame is kept.
+    def __start_grabber(self):
+        if not self.camera_open or self.__grabbing:
+            return
+        self.__grabbing = True
+        self.__grab_thread = threading.Thread(target=self.__grab_frames, name="Camera Capture")
+        self.__grab_thread.daemon = True
+        self.__grab_thread.start()
+
+    # Stops the capture thread and waits for it to finish its current read
+    def __stop_grabber(self):
+        self.__grabbing = False
+        if self.__grab_thread is not None:
+            self.__grab_thread.join(1.0)
+            self.__grab_thread = None
+
+    # Capture thread loop: publish each new frame with a sequence number and capture timestamp, dropping the old one.
+    # A recording that runs out stops the thread, so anyone waiting for a frame is told there are no more.
+    def __grab_frames(self):
+        while self.__grabbing and self.camera_open:
+            if self.replay is not None:
+                self.cap.wait()  # Realtime playback is paced outside the lock, the settings can still be changed
+            with self.cap_lock:
+                ret, img = self.cap.read()
+            capture_time = time.time()
+            if not ret:
+                if self.replay is not None and self.cap.finished():
+                    print("Maze Camera: End of the recording")
+                    break
+                time.sleep(0.01)  # Camera hiccup, try again shortly
+                continue
+            with self.__frame_ready:
+                self.__latest_frame = img
+                self.frame_seq += 1
+                self.frame_time = capture_time
+                self.__frame_ready.notify_all()
+            self.__record_frame(img, capture_time)
+        with self.__frame_ready:
+            self.__grabbing = False
+            self.__frame_ready.notify_all()
+
+    # Returns the current time in the timebase the frames are stamped in: time.time(), except for a recording played
+    # back as fast as possible, whose frames keep their recorded capture times; then it is the newest frame's recorded
+    # time plus the time since it was read.
+    def now(self):
+        return time.time() + self.clock_offset()
+
+    # Returns the difference between the frame timebase and time.time() (0 except for a recording played back as fast
+    # as possible)
+    def clock_offset(self):
+        if self.replay is not None and self.camera_open and not self.replay_realtime:
+            return self.frame_time - self.__frame_read_time
+        return 0.0
+
+    # Returns (image, sequence number, capture timestamp) of the newest frame without waiting on the camera.
+    # If newer_than is given, waits (up to timeout seconds) for a frame with a larger sequence number so the same
+    # frame is not processed twice.  The image is None if no newer frame came (the camera stopped or the recording
+    # ran out).
+    def get_latest_frame(self, newer_than=None, timeout=1.0):
+        with self.__frame_ready:
+            if newer_than is None:
+                newer_than = 0  # Only wait if no frame has been captured yet
+            if self.frame_seq <= newer_than:
+                self.__frame_ready.wait_for(lambda: self.frame_seq > newer_than or not self.__grabbing, timeout)
+            if self.frame_seq <= newer_than:
+                return None, self.frame_seq, self.frame_time
+            return self.__latest_frame, self.frame_seq, self.frame_time
+
+# ------------------------------------------- Recording ---------------------------------------------------------------#
+    # Starts saving every captured frame (with its capture time) to a recording file that can later be played back
+    # with Maze_Camera(replay=filename)
+    def start_recording(self, filename=None):
+        if self.__recorder is not None:
+            print("Maze Camera: Already recording")
+            return
+        if filename is None:
+            filename = time.strftime("recording_%Y%m%d_%H%M%S.frames")
+        try:
+            self.__recorder = Frame_Recorder(filename)
+        except Exception as error:
+            print("Maze Camera: Failed to start recording for the following reason:")
+            print(error)
+
+    # Stops recording and closes the recording file
+    def stop_recording(self):
+        recorder = self.__recorder
+        self.__recorder = None
+        if recorder is not None:
+            recorder.close()
+
+    # Returns true if frames are being recorded
+    def is_recording(self):
+        return self.__recorder is not None
+
+    # Saves a captured frame if recording.  A failed write (disk full, file closed) stops the recording rather than the
+    # capture thread or replay it is called from.
+    def __record_frame(self, img, capture_time):
+        recorder = self.__recorder
+        if recorder is not None:
+            try:
+                recorder.write(img, capture_time)
+            except Exception as error:
+                print("Maze Camera: Recording stopped for the following reason:")
+                print(error)
+                if self.__recorder is recorder:
+                    self.__recorder = None
+                try:
+                    recorder.close()
+                except Exception:
+                    pass  # The file is already unusable
+
 # ------------------------------ Set Brightness and Exposure ----------------------------------------------------------#
     # Set camera exposure
     def set_exposure(self, x):
         if self.camera_open and self.camera_setup:
             try:
                 self.cam_exposure_value = int(x)
-                if self.OS == 'Windows':
-                    self.cap.set(cv2.CAP_PROP_EXPOSURE, int(x))
-                else:
-                    self.cap.set(cv2.CAP_PROP_EXPOSURE , int(x) / CAM_MAX_EXPOSURE_LINUX)
+                with self.cap_lock:
+                    if self.OS == 'Windows':
+                        self.cap.set(cv2.CAP_PROP_EXPOSURE, int(x))
+                    else:
+                        self.cap.set(cv2.CAP_PROP_EXPOSURE , int(x) / CAM_MAX_EXPOSURE_LINUX)
+                self.reset_background()  # The board will look brighter or darker
             except:
                 print("Maze Camera: set_exposure error")
         else:
@@ -194,10 +583,12 @@ class Maze_Camera():
         if self.camera_open and self.camera_setup:
             try:
                 self.cam_brightness_value = int(x)
-                if self.OS == 'Windows':
-                    self.cap.set(cv2.CAP_PROP_BRIGHTNESS, int(x))
-                else:
-                    self.cap.set(cv2.CAP_PROP_BRIGHTNESS , int(x) / CAM_MAX_BRIGHTNESS_LINUX)
+                with self.cap_lock:
+                    if self.OS == 'Windows':
+                        self.cap.set(cv2.CAP_PROP_BRIGHTNESS, int(x))
+                    else:
+                        self.cap.set(cv2.CAP_PROP_BRIGHTNESS , int(x) / CAM_MAX_BRIGHTNESS_LINUX)
+                self.reset_background()  # The board will look brighter or darker
             except:
                 print("Maze Camera: set_brightness error")
         else:
@@ -222,6 +613,117 @@ class Maze_Camera():
         except:
             print("Maze Camera: Unable to load brightness and exposure settings from camSettings.txt.")
 
+# ----------------------------------- Automatic Exposure --------------------------------------------------------------#
+    # Returns (mean grey level, fraction of blown out pixels) of the maze board in a frame context.  The board is
+    # measured after the corner transformation so the room around the maze does not count.
+    def __board_exposure(self, frame):
+        hist = cv2.calcHist([frame.gray()], [0], None, [256], [0, 256]).ravel()
+        total = max(hist.sum(), 1)
+        mean = float(np.dot(hist, np.arange(256)) / total)
+        clipped = float(hist[250:].sum() / total)
+        return mean, clipped
+
+    # Returns the (exposure, brightness) to try next, given the board mean grey level and blown out fraction.
+    # Exposure does most of the work; brightness is only changed once exposure is at its limit.
+    def __next_exposure(self, mean, clipped):
+        ratio = AUTO_EXPOSURE_TARGET / max(mean, 1.0)  # Change in light needed to reach the target
+        if clipped > AUTO_EXPOSURE_CLIPPED:
+            ratio = min(ratio, 0.7)  # Blown out highlights hide the walls, always darken
+        darker = ratio < 1
+
+        exposure = self.cam_exposure_value
+        if self.OS == 'Windows':
+            # Windows exposure is log2 of the exposure time
+            step = int(round(np.log2(ratio)))
+            step = max(-2, min(2, step))
+            if step == 0:
+                step = -1 if darker else 1
+            exposure += step
+        else:
+            # Linux exposure is proportional to the exposure time
+            target = int(round(exposure * ratio))
+            if target == exposure:
+                target += -1 if darker else 1
+            exposure = target
+        exposure = int(max(self.cam_exposure_min, min(self.cam_exposure_max, exposure)))
+
+        brightness = self.cam_brightness_value
+        if exposure == self.cam_exposure_value:
+            # Exposure can go no further, move the brightness by half of the error instead
+            brightness_range = self.cam_brightness_max - self.cam_brightness_min
+            step = int(round((AUTO_EXPOSURE_TARGET - mean) * brightness_range / 255.0 / 2))
+            if clipped > AUTO_EXPOSURE_CLIPPED:
+                step = min(step, -1)
+            if step == 0:
+                step = -1 if darker else 1
+            brightness = int(max(self.cam_brightness_min, min(self.cam_brightness_max, brightness + step)))
+        return exposure, brightness
+
+    # Adjusts exposure and brightness until the maze board mean grey level is within AUTO_EXPOSURE_TOLERANCE of
+    # AUTO_EXPOSURE_TARGET with few blown out pixels.  Each step waits for the camera to apply the new settings and
+    # measures a fresh frame.  Returns true if the settings converged.
+    def auto_calibrate_exposure(self, max_steps=AUTO_EXPOSURE_MAX_STEPS):
+        if self.replay is not None or not (self.camera_open and self.camera_setup and self.__grabbing):
+            print("Maze Camera: Auto exposure error: camera not ready")
+            return False
+
+        frame = self.get_frame_context(newer_than=self.frame_seq)  # Measure a frame taken with the current settings
+        for step in range(max_steps + 1):
+            if frame is None:
+                print("Maze Camera: Auto exposure error: no frame")
+                return False
+            mean, clipped = self.__board_exposure(frame)
+            if abs(mean - AUTO_EXPOSURE_TARGET) <= AUTO_EXPOSURE_TOLERANCE and clipped <= AUTO_EXPOSURE_CLIPPED:
+                if step > 0:
+                    print("Maze Camera: Auto exposure converged after", step, "step(s): exposure",
+                          self.cam_exposure_value, "brightness", self.cam_brightness_value, "board mean", round(mean))
+                return True
+            if step == max_steps:
+                break
+
+            exposure, brightness = self.__next_exposure(mean, clipped)
+            if exposure == self.cam_exposure_value and brightness == self.cam_brightness_value:
+                break  # Both settings are at their limits
+            if exposure != self.cam_exposure_value:
+                self.set_exposure(exposure)
+            if brightness != self.cam_brightness_value:
+                self.set_brightness(brightness)
+
+            # Skip the frames that may have been exposed with the old settings
+            seq = frame.seq
+            for i in range(AUTO_EXPOSURE_SETTLE_FRAMES):
+                seq = self.get_latest_frame(newer_than=seq)[1]
+            frame = self.get_frame_context(newer_than=seq)
+
+        print("Maze Camera: Auto exposure did not converge: exposure", self.cam_exposure_value, "brightness",
+              self.cam_brightness_value, "board mean", round(mean))
+        return False
+
+    # Starts a background thread that runs auto exposure every interval seconds, to follow the room lighting.
+    # Settings that converged to new values are saved to the camera settings file.
+    def start_auto_exposure(self, interval=AUTO_EXPOSURE_INTERVAL):
+        if self.__auto_exposure_thread is not None:
+            return
+        self.__auto_exposure_stop.clear()
+        self.__auto_exposure_thread = threading.Thread(target=self.__auto_exposure_loop, args=(interval,),
+                                                       name="Auto Exposure")
+        self.__auto_exposure_thread.daemon = True
+        self.__auto_exposure_thread.start()
+
+    # Stops the background auto exposure
+    def stop_auto_exposure(self):
+        self.__auto_exposure_stop.set()
+        if self.__auto_exposure_thread is not None:
+            self.__auto_exposure_thread.join(5.0)
+            self.__auto_exposure_thread = None
+
+    # Background auto exposure loop
+    def __auto_exposure_loop(self, interval):
+        while not self.__auto_exposure_stop.wait(interval):
+            settings = (self.cam_brightness_value, self.cam_exposure_value)
+            if self.auto_calibrate_exposure() and settings != (self.cam_brightness_value, self.cam_exposure_value):
+                self.save_cam_settings()
+
 # -------------------- Filters and Stuff ----------------------------------------------------------#
     # This function will read in threshold values from a text file
     def __init_thresholds(self):
@@ -256,6 +758,7 @@ class Maze_Camera():
             threshold_class.V_MAX = int(file.readline())
         except:
             print("Maze Camera: failed to read in file")
+        threshold_class.update_bounds()
 
     def __write_values_to_file(self, file, threshold_class):
         file.write("{}\n{}\n{}\n{}\n{}\n{}\n".format(threshold_class.H_MIN, threshold_class.H_MAX, threshold_class.S_MIN,
@@ -290,12 +793,10 @@ class Maze_Camera():
             thresh.S_MAX = cv2.getTrackbarPos('S_MAX', name)
             thresh.V_MIN = cv2.getTrackbarPos('V_MIN', name)
             thresh.V_MAX = cv2.getTrackbarPos('V_MAX', name)
+            thresh.update_bounds()
 
             # Use threshold values to create a filtered image
-            img = cv2.inRange(HSV, np.array([thresh.H_MIN, thresh.S_MIN, thresh.V_MIN]),
-                              np.array([thresh.H_MAX, thresh.S_MAX, thresh.V_MAX]))
-            img = cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel)
-            img = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel)
+            img = self._filter_image(HSV, thresh)
 
             # Display a fitlered image
             cv2.putText(img, 'Press Spacebar to Continue', (5, 25), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
@@ -319,84 +820,135 @@ class Maze_Camera():
 
 
 # --------------------------------- Camera and Filter Images ----------------------------------------------------------#
+    # Returns a frame context for a single captured frame.  The camera is read once and every image derived from the
+    # frame is made on demand and shared by everyone using the context.
+    # transform is a bool flag, if true the derived images are transformed based on the corners
+    # newer_than is an optional frame sequence number; the context will hold a newer frame than that one
+    def get_frame_context(self, transform=True, newer_than=None):
+        raw, seq, capture_time = self.__read_image(newer_than)
+        if raw is None:
+            return
+        return self.FrameContext(self, raw, seq, capture_time, transform)
+
     # Returns a raw, unfiltered image. transform is a bool flag, if true it will return a transformed image based on the
     # corners
     def get_image_unfiltered(self, transform=False):
-        if self.noCam:
-            img = cv2.imread(NOCAM_IMG,cv2.IMREAD_COLOR)
-
-        elif self.camera_open:
-            # Read and return image from camera
-            ret, img = self.cap.read()
-        else:
+        frame = self.get_frame_context(transform)
+        if frame is None:
             return
-        # Apply transformation to image if needed
-        if transform:
-            try:
-                img = self.__crop_image(img)
-            except:
-                print("Maze Camera: Get Image Error: failed to get transformed image")
-        return img
+        return frame.image()
 
     # Returns an image filtered with the threshold values for the walls
     # transform is a bool flag, if true it will return a transformed image based on the
     # corners
     def get_image_wall_filtered(self, transform=False):
-        if self.noCam:
-            img = cv2.imread(NOCAM_IMG,cv2.IMREAD_COLOR)
-
-        elif self.camera_open:
-            # Read and return image from camera
-            ret, img = self.cap.read()
-
-        else:
+        frame = self.get_frame_context(transform)
+        if frame is None:
             return
-
-        # Apply transformation to image if needed
-        if transform:
-            try:
-                img = self.__crop_image(img)
-            except:
-                print("Maze Camera: Get Image Error: failed to get transformed image")
-
-        # Convert it to HSV and fitler it
-        HSV = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        walls_img = cv2.inRange(HSV, np.array([self.wallsThreshold.H_MIN, self.wallsThreshold.S_MIN, self.wallsThreshold.V_MIN]),
-                                np.array([self.wallsThreshold.H_MAX, self.wallsThreshold.S_MAX, self.wallsThreshold.V_MAX]))
-        walls_img = cv2.morphologyEx(walls_img, cv2.MORPH_OPEN, kernel)
-        walls_img = cv2.morphologyEx(walls_img, cv2.MORPH_CLOSE, kernel)
-
-        return walls_img
+        return frame.walls()
 
     # Returns an image filtered with the threshold values for the endpoint
     # transform is a bool flag, if true it will return a transformed image based on the
     # corners
     def get_image_endpoint_filtered(self, transform=False):
-        if self.noCam:
-            img = cv2.imread(NOCAM_IMG,cv2.IMREAD_COLOR)
+        frame = self.get_frame_context(transform)
+        if frame is None:
+            return
+        return frame.endpoint()
 
-        elif self.camera_open:
-            # Read and return image from camera
+    # Returns (image, sequence number, capture timestamp) for the newest camera frame (or the test image in no camera
+    # mode)
+    def __read_image(self, newer_than=None):
+        if self.noCam:
             ret, img = self.cap.read()
+            if not ret:
+                return None, 0, 0
+            self.frame_seq += 1
+            self.frame_time = self.cap.frame_time
+            return img, self.frame_seq, self.frame_time
 
-        else:
-            return
-
-        # Apply transformation to image if needed
-        if transform:
-            try:
-                img = self.__crop_image(img)
-            except:
-                print("Maze Camera: Get Image Error: failed to get transformed image")
+        elif self.camera_open:
+            if self.__grabbing:
+                # Take the newest frame published by the capture thread
+                return self.get_latest_frame(newer_than)
+
+            # Recording played back as fast as possible: read the next frame, stamped with its recorded capture time
+            with self.cap_lock:
+                ret, img = self.cap.read()
+            if not ret:
+                return None, 0, 0
+            self.frame_seq += 1
+            self.frame_time = self.cap.frame_time
+            self.__frame_read_time = time.time()
+            self.__record_frame(img, self.frame_time)
+            return img, self.frame_seq, self.frame_time
+
+        return None, 0, 0
+
+    # Applies the corner transformation to an image
+    def _transform_image(self, img):
+        try:
+            img = self.__crop_image(img)
+        except:
+            print("Maze Camera: Get Image Error: failed to get transformed image")
+        return img
 
-        # Convert it to HSV and filter it
-        HSV = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        endPoint_img = cv2.inRange(HSV, np.array([self.endPointThreshold.H_MIN, self.endPointThreshold.S_MIN, self.endPointThreshold.V_MIN]),
-                                   np.array([self.endPointThreshold.H_MAX, self.endPointThreshold.S_MAX, self.endPointThreshold.V_MAX]))
-        endPoint_img = cv2.morphologyEx(endPoint_img, cv2.MORPH_OPEN, kernel)
-        endPoint_img = cv2.morphologyEx(endPoint_img, cv2.MORPH_CLOSE, kernel)
+    # Filters an HSV image with the bounds of a threshold class.  The walls and endpoint are filtered separately (a
+    # colour lookup table or one pass over a two channel image measured no faster, and most frames only need the walls)
+    def _filter_image(self, HSV, thresh):
+        img = cv2.inRange(HSV, thresh.lower, thresh.upper)
+        img = cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel)
+        img = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel)
+        return img
 
-        return endPoint_img
+# ------------------------------------------ Background Model ---------------------------------------------------------#
+    # Returns the foreground image of a grey maze image (frame sequence number seq) and adds the image to the background
+    # model.  Returns None until the first BACKGROUND_WARMUP frames have made a model.
+    def _foreground_mask(self, gray, seq):
+        with self.__background_lock:
+            new_frame = seq > self.__background_seq  # Older frames (or the same frame again) are not added twice
+            if new_frame:
+                self.__background_seq = seq
+            if self.__background is not None and self.__background.shape != gray.shape:
+                self.__background = None
+            if self.__background is None:
+                if new_frame:
+                    self.__background_warmup.append(gray)
+                if len(self.__background_warmup) < BACKGROUND_WARMUP:
+                    return
+                # The median of each pixel is the empty board unless the Sphero sat on it for half the frames
+                self.__background = np.median(np.array(self.__background_warmup), axis=0).astype(np.float32)
+                self.__background_warmup = []
+
+            difference = cv2.absdiff(gray, cv2.convertScaleAbs(self.__background))
+            ret, mask = cv2.threshold(difference, BACKGROUND_THRESHOLD, 255, cv2.THRESH_BINARY)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)  # Remove single pixel noise
+            if new_frame:
+                if cv2.countNonZero(mask) > BACKGROUND_MAX_FRACTION * mask.size:
+                    print("Maze Camera: Board changed too much for the background model, starting it again")
+                    self.__background = None
+                    self.__background_warmup = [gray]
+                    return
+                cv2.accumulateWeighted(gray, self.__background, BACKGROUND_RATE, cv2.bitwise_not(mask))
+                cv2.accumulateWeighted(gray, self.__background, BACKGROUND_FOREGROUND_RATE, mask)
+        return mask
+
+    # Returns the bounding boxes (x, y, width, height) of the blobs in a foreground image, largest first (None if there
+    # is no foreground image)
+    def _foreground_blobs(self, mask):
+        if mask is None:
+            return
+        # Outer contours are much faster than labelling every pixel for a mostly empty image
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        contours = [c for c in contours if cv2.contourArea(c) >= BACKGROUND_MIN_AREA]
+        contours.sort(key=cv2.contourArea, reverse=True)
+        return [cv2.boundingRect(c) for c in contours]
+
+    # Forgets the background model (the maze image changed: new corners, lens calibration or camera settings)
+    def reset_background(self):
+        with self.__background_lock:
+            self.__background = None
+            self.__background_warmup = []
 
 # --------------------------------- Setting and Getting Corners ----------------------------------------------------------#
     # Get corners returns a list of corner coordinates
@@ -409,7 +961,7 @@ class Maze_Camera():
         if self.corners_set:
             print("Maze Camera: Saving corner values to file")
             with open(CORNERS_FILE, "w") as f:
-                json.dump((self.maze_ROI, self.corners), f)
+                json.dump((self.maze_ROI, self.corners, self.corners_resolution), f)
 
 
 
@@ -417,22 +969,34 @@ class Maze_Camera():
     def __load_corners(self):
         try:
             with open(CORNERS_FILE) as f:
-                self.maze_ROI, self.corners = json.load(f)
+                corner_data = json.load(f)
+            self.maze_ROI, self.corners = corner_data[:2]
+            # Capture resolution the corners were picked at (older files do not have it)
+            self.corners_resolution = corner_data[2] if len(corner_data) > 2 else None
             print("Maze Camera: Loading previous corner values from file: ", self.corners)
             self.corners_set = True
+            self.__warp_maps = None  # Corners changed, rebuild the transformation
         except:
             print("Maze Camera: Unable to load corner data from corners.txt. Please set corners before running maze")
 
-    # Set the corners used for the maze
+    # Set the corners used for the maze.  The corners found by detect_corners are outlined on the image and can be
+    # accepted with enter, otherwise the corners are clicked by hand.
     def set_corners(self):
-        # Collect a raw image of the maze
-        corners_img = self.get_image_unfiltered()
+        # Collect a raw image of the maze (copied, camera frames may be shared and read only)
+        corners_img = self.get_image_unfiltered().copy()
+        resolution = [corners_img.shape[1], corners_img.shape[0]]
+        detected = self.detect_corners(corners_img)
 
         self.corners_set = False  # Set to false to lockdown get_corners function
         old_corners = self.corners
         self.corners = []   # Reset corners
 
         # Put instructions on image before showing it
+        if detected is not None:
+            outline = np.array(self.__order_corners(detected), np.int32)[[0, 1, 3, 2]]  # Z order to outline order
+            cv2.polylines(corners_img, [outline], True, (255, 0, 255), max(2, corners_img.shape[1] // 400))
+            cv2.putText(corners_img, 'Press enter to use the outlined corners', (10, 60), cv2.FONT_HERSHEY_SIMPLEX,
+                        .8, (255, 0, 255), 2)
         cv2.putText(corners_img, 'Click on maze corners; press space to skip', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, .8, (255, 0, 255),
                     2)
         cv2.imshow('Add Corners', corners_img)  # Show an image for the user to reference
@@ -445,49 +1009,60 @@ class Maze_Camera():
                 self.corners = old_corners
                 cv2.destroyWindow('Add Corners')
                 return
+            if k in (10, 13) and detected is not None:  # Enter, use the detected corners
+                self.corners = detected
+                break
 
-        # Store the X and Y pixel boundaries bound by the corners in the maze_ROI dictionary
-        self.maze_ROI['row1'] = int(min(y for x, y in self.corners))
-        self.maze_ROI['row2'] = int(max(y for x, y in self.corners))
-        self.maze_ROI['col1'] = int(min(x for x, y in self.corners))
-        self.maze_ROI['col2'] = int(max(x for x, y in self.corners))
-
-        # Store an unaltered copy of corners
-        unaltered_corners = []
-        for p in self.corners:
-            unaltered_corners.append((p[0],p[1]))
-
-        # We will sort the corners to get this order:
-        # 1st: Upper left hand corner of image
-        # 2nd: Upper right hand corner of image
-        # 3rd: Lower left hand corner of image
-        # 4th: Lower right hand corner of image
-        # Essentially the corners should trace out a "Z" on the image
+        self.__store_corners(self.corners, resolution)
+        cv2.destroyWindow('Add Corners')
 
+    # Sorts four corners (image coordinates) into this order:
+    # 1st: Upper left hand corner of image
+    # 2nd: Upper right hand corner of image
+    # 3rd: Lower left hand corner of image
+    # 4th: Lower right hand corner of image
+    # Essentially the corners should trace out a "Z" on the image
+    def __order_corners(self, points):
         # Sort the corners based on ascending column (Y) values
-        self.corners = sorted(self.corners, key=lambda k: k[1])
+        corners = sorted([[p[0], p[1]] for p in points], key=lambda k: k[1])
 
         # Sort the upper corners
-        if self.corners[0][0] > self.corners[1][0]:
-            temp = self.corners[0]
-            self.corners[0] = self.corners[1]
-            self.corners[1] = temp
+        if corners[0][0] > corners[1][0]:
+            corners[0], corners[1] = corners[1], corners[0]
 
         # Sort the lower corners
-        if self.corners[2][0] > self.corners[3][0]:
-            temp = self.corners[2]
-            self.corners[2] = self.corners[3]
-            self.corners[3] = temp
+        if corners[2][0] > corners[3][0]:
+            corners[2], corners[3] = corners[3], corners[2]
+        return corners
 
-        # Set the minimum X value to zero reference, and the minimum Y value to zero reference
-        for i in range(len(self.corners)):
-            self.corners[i][0] -= int(min(x for x, y in unaltered_corners))
-            self.corners[i][1] -= int(min(y for x, y in unaltered_corners))
+    # Stores four corners (image coordinates, any order) picked on an image of size resolution ([width, height]),
+    # saves them and rebuilds the transformation
+    def __store_corners(self, points, resolution):
+        # Store the X and Y pixel boundaries bound by the corners in the maze_ROI dictionary
+        maze_ROI = {'row1': int(min(y for x, y in points)),
+                    'row2': int(max(y for x, y in points)),
+                    'col1': int(min(x for x, y in points)),
+                    'col2': int(max(x for x, y in points))}
 
-        self.corners_set = True
+        # Set the minimum X value to zero reference, and the minimum Y value to zero reference
+        corners = self.__order_corners(points)
+        for corner in corners:
+            corner[0] -= maze_ROI['col1']
+            corner[1] -= maze_ROI['row1']
+
+        with self.__corners_lock:
+            self.maze_ROI = maze_ROI
+            self.corners = corners
+            self.corners_resolution = list(resolution)  # Remember the capture resolution the corners were picked at
+            self.corners_set = True
+            self.__warp_maps = None  # Corners changed, rebuild the transformation
         self.__save_corners()
-        cv2.destroyWindow('Add Corners')
 
+    # Returns the corners (Z order) in image coordinates for an image of size width x height
+    def __absolute_corners(self, width, height):
+        scale_x, scale_y = self.__corners_scale(width, height)
+        return [[(x + self.maze_ROI['col1']) / scale_x, (y + self.maze_ROI['row1']) / scale_y]
+                for x, y in self.corners]
 
     # Used by getCorners to select corners by user mouse clicks
     def CallBackFunc(self, event, x, y, flags, userdata):
@@ -499,27 +1074,286 @@ class Maze_Camera():
             print("Corner Added", [x,y])
             self.corners.append([x,y])
 
+# ------------------------------------------ Corner Detection ---------------------------------------------------------#
+    # Finds the maze board in a raw camera image (the newest frame if img is None) and returns its four corners
+    # (image coordinates, any order), or None if no board was found.
+    # The board floor is the large dark area enclosed by the white outer wall.  The image is split into dark and light
+    # with Otsu's threshold, and the largest dark area that does not touch the edge of the image is taken as the floor.
+    # Its convex hull skips over the walls and posts that cut into it, and is simplified down to four corners.
+    def detect_corners(self, img=None):
+        if img is None:
+            frame = self.get_frame_context(transform=False)
+            if frame is None:
+                return
+            img = frame.raw
+        scale = min(1.0, CORNER_DETECT_WIDTH / float(img.shape[1]))
+        small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        ret, dark = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        dark = cv2.morphologyEx(dark, cv2.MORPH_OPEN, kernel)
+
+        # Outer boundaries of the dark areas (holes are skipped); the floor is enclosed so it never touches the edge
+        contours, hierarchy = cv2.findContours(dark, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)[-2:]
+        height, width = dark.shape
+        board = None
+        board_area = CORNER_MIN_AREA * width * height
+        for i, contour in enumerate(contours):
+            x, y, w, h = cv2.boundingRect(contour)
+            if hierarchy[0][i][3] != -1 or x <= 1 or y <= 1 or x + w >= width - 1 or y + h >= height - 1:
+                continue
+            hull = cv2.convexHull(contour)
+            area = cv2.contourArea(hull)
+            if area > board_area:
+                board, board_area = hull, area
+        if board is None:
+            return
+
+        # Simplify the hull to four corners
+        perimeter = cv2.arcLength(board, True)
+        for tolerance in (0.01, 0.02, 0.04, 0.06):
+            quad = cv2.approxPolyDP(board, tolerance * perimeter, True)
+            if len(quad) <= 4:
+                break
+        if len(quad) != 4:
+            return
+        return [[int(round(x / scale)), int(round(y / scale))] for x, y in quad.reshape(4, 2)]
+
+    # Detects the corners in the newest frame and uses them.  Returns true if the board was found.
+    def auto_set_corners(self):
+        frame = self.get_frame_context(transform=False)
+        if frame is None:
+            return False
+        detected = self.detect_corners(frame.raw)
+        if detected is None:
+            print("Maze Camera: Unable to find the maze corners, please set corners before running maze")
+            return False
+        print("Maze Camera: Found maze corners", self.__order_corners(detected))
+        self.__store_corners(detected, [frame.raw.shape[1], frame.raw.shape[0]])
+        return True
+
+    # Checks the newest frame for the board having moved (camera mount bumped).  New corners are only used once
+    # CORNER_TRACK_CONFIRMATIONS checks in a row agree on them, so a hand or the Sphero hiding a corner for a moment
+    # does not move the transformation.  Returns true if the corners were updated.
+    def track_corners(self):
+        if not self.corners_set:
+            return self.auto_set_corners()
+        frame = self.get_frame_context(transform=False)
+        if frame is None:
+            return False
+        height, width = frame.raw.shape[:2]
+        detected = self.detect_corners(frame.raw)
+        if detected is None:
+            self.__corner_candidate = None
+            return False
+        detected = np.array(self.__order_corners(detected), np.float32)
+        current = np.array(self.__absolute_corners(width, height), np.float32)
+
+        # Ignore outlines that are far from the right size, part of the board is probably hidden
+        area_ratio = cv2.contourArea(detected[[0, 1, 3, 2]]) / max(cv2.contourArea(current[[0, 1, 3, 2]]), 1.0)
+        tolerance = CORNER_DRIFT_TOLERANCE * max(1.0, width / float(CORNER_DETECT_WIDTH))
+        if not 0.75 < area_ratio < 1.33 or np.linalg.norm(detected - current, axis=1).max() <= tolerance:
+            self.__corner_candidate = None
+            return False
+
+        # The board moved; wait for the next checks to agree
+        if self.__corner_candidate is not None and \
+                np.linalg.norm(detected - self.__corner_candidate, axis=1).max() <= tolerance:
+            self.__corner_confirmations += 1
+        else:
+            self.__corner_candidate = detected
+            self.__corner_confirmations = 1
+        if self.__corner_confirmations < CORNER_TRACK_CONFIRMATIONS:
+            return False
+
+        print("Maze Camera: Maze board moved by", round(float(np.linalg.norm(detected - current, axis=1).max()), 1),
+              "pixels, updating corners")
+        self.__store_corners(detected.round().astype(int).tolist(), [width, height])
+        self.__corner_candidate = None
+        return True
+
+    # Starts a background thread that runs track_corners every interval seconds
+    def start_corner_tracking(self, interval=CORNER_TRACK_INTERVAL):
+        if self.__corner_thread is not None:
+            return
+        self.__corner_stop.clear()
+        self.__corner_thread = threading.Thread(target=self.__corner_tracking_loop, args=(interval,),
+                                                name="Corner Tracker")
+        self.__corner_thread.daemon = True
+        self.__corner_thread.start()
+
+    # Stops the background corner tracking
+    def stop_corner_tracking(self):
+        self.__corner_stop.set()
+        if self.__corner_thread is not None:
+            self.__corner_thread.join(5.0)
+            self.__corner_thread = None
+
+    # Background corner tracking loop
+    def __corner_tracking_loop(self, interval):
+        while not self.__corner_stop.wait(interval):
+            self.track_corners()
+
+# ------------------------------------------ Lens Calibration ---------------------------------------------------------#
+    # One off calibration of the camera lens.  Hold a printed chessboard (CHESSBOARD_SIZE inner corners) in front of the
+    # camera and press enter to capture a view whenever its corners are drawn; move and tilt the board between views,
+    # covering the edges of the image where the distortion is worst.  After LENS_CALIBRATION_VIEWS views the camera
+    # matrix and distortion are solved for and saved, and the maze image is undistorted from then on.
+    # Returns true if the lens was calibrated.
+    def calibrate_lens(self, views=LENS_CALIBRATION_VIEWS):
+        font = cv2.FONT_HERSHEY_SIMPLEX  # Font used for image text
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)  # Sub pixel corner refinement
+        image_points = []  # Chessboard corners found in each captured view
+        resolution = None
+        while len(image_points) < views:
+            frame = self.get_frame_context(transform=False)
+            if frame is None:
+                print("Maze Camera: Lens calibration error: no frame")
+                break
+            img = frame.raw.copy()
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            found, corners = cv2.findChessboardCorners(gray, CHESSBOARD_SIZE, cv2.CALIB_CB_ADAPTIVE_THRESH +
+                                                       cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK)
+            if found:
+                cv2.drawChessboardCorners(img, CHESSBOARD_SIZE, corners, found)
+
+            cv2.putText(img, 'Press enter to capture the chessboard ({}/{}); press space to cancel'.format(
+                len(image_points), views), (10, 30), font, .8, (255, 0, 255), 2)
+            cv2.imshow('Lens Calibration', img)
+            k = cv2.waitKey(30)
+            if k == 32:
+                break
+            if k in (10, 13) and found:
+                image_points.append(cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria))
+                resolution = [gray.shape[1], gray.shape[0]]
+
+        cv2.destroyWindow('Lens Calibration')
+        if len(image_points) < views:
+            print("Maze Camera: Lens calibration cancelled")
+            return False
+        return self.__solve_lens(image_points, resolution)
+
+    # Solves for the camera matrix and lens distortion from chessboard corners found in several views of size
+    # resolution ([width, height]), then saves them and rebuilds the transformation
+    def __solve_lens(self, image_points, resolution):
+        board = np.zeros((CHESSBOARD_SIZE[0] * CHESSBOARD_SIZE[1], 3), np.float32)
+        board[:, :2] = np.mgrid[0:CHESSBOARD_SIZE[0], 0:CHESSBOARD_SIZE[1]].T.reshape(-1, 2)
+        try:
+            error, matrix, distortion, rvecs, tvecs = cv2.calibrateCamera([board] * len(image_points), image_points,
+                                                                          tuple(resolution), None, None)
+        except cv2.error as error:
+            print("Maze Camera: Lens calibration failed for the following reason:")
+            print(error)
+            return False
+        print("Maze Camera: Lens calibrated, reprojection error", round(error, 3), "pixels")
+
+        with self.__corners_lock:
+            self.lens = {'matrix': matrix.tolist(), 'distortion': distortion.ravel().tolist(),
+                         'resolution': list(resolution)}
+            self.__warp_maps = None  # Lens changed, rebuild the transformation
+        self.__save_lens_calibration()
+        return True
+
+    # Removes the lens calibration, the maze image is no longer undistorted
+    def clear_lens_calibration(self):
+        with self.__corners_lock:
+            self.lens = None
+            self.__warp_maps = None
+        if os.path.exists(LENS_CALIBRATION_FILE):
+            os.remove(LENS_CALIBRATION_FILE)
+
+    # This function will write the lens calibration to a text file
+    def __save_lens_calibration(self):
+        print("Maze Camera: Saving lens calibration to file")
+        with open(LENS_CALIBRATION_FILE, "w") as f:
+            json.dump(self.lens, f)
+
+    # This function will read in the lens calibration from a text file
+    def __load_lens_calibration(self):
+        if not os.path.exists(LENS_CALIBRATION_FILE):
+            return  # Lens not calibrated, images are not undistorted
+        try:
+            with open(LENS_CALIBRATION_FILE) as f:
+                self.lens = json.load(f)
+            print("Maze Camera: Loading lens calibration from file")
+            self.__warp_maps = None
+        except:
+            print("Maze Camera: Unable to load lens calibration from " + LENS_CALIBRATION_FILE)
+
 # ------------------------------------------ Transformations ----------------------------------------------------------#
 
-    def __getTransformation(self):
+    # Returns the transformation from a full camera image of size width x height to the maze image
+    def __getTransformation(self, width, height):
         if not self.corners_set:
             print("Maze Camera: Transform Error: corners not set")
 
         else:
-            transformed_corners = [[0, 0], [PERSPECTIVE_WIDTH - 0, 0], [0, PERSPECTIVE_HEIGHT - 0],
-                                   [PERSPECTIVE_WIDTH - 0, PERSPECTIVE_HEIGHT - 0]]
+            transformed_corners = [[0, 0], [self.geometry.width, 0], [0, self.geometry.height],
+                                   [self.geometry.width, self.geometry.height]]
 
             transformation = cv2.getPerspectiveTransform(np.array(self.corners, np.float32),
                                                          np.array(transformed_corners, np.float32))
-            return transformation
+            # The corners are relative to the maze ROI; shift by the ROI origin so the transformation maps straight
+            # from the full camera image to the maze image
+            roi_offset = np.array([[1, 0, -self.maze_ROI['col1']],
+                                   [0, 1, -self.maze_ROI['row1']],
+                                   [0, 0, 1]], np.float64)
+            # Scale from the capture resolution to the resolution the corners were picked at
+            scale_x, scale_y = self.__corners_scale(width, height)
+            resolution_scale = np.diag([scale_x, scale_y, 1.0])
+            return transformation.dot(roi_offset).dot(resolution_scale)
+
+    # Returns (camera matrix, distortion, transformation) for a full camera image of size width x height when the lens
+    # is calibrated.  The transformation maps undistorted, normalised image coordinates (what the camera matrix and
+    # distortion turn a pixel into) to the maze image, so the corners are undistorted before fitting it.
+    def __getLensTransformation(self, width, height):
+        # Scale the camera matrix from the calibration resolution (assumes the capture modes are scaled, not cropped)
+        camera_matrix = np.array(self.lens['matrix'], np.float64)
+        camera_matrix[0] *= width / float(self.lens['resolution'][0])
+        camera_matrix[1] *= height / float(self.lens['resolution'][1])
+        distortion = np.array(self.lens['distortion'], np.float64)
+
+        transformed_corners = [[0, 0], [self.geometry.width, 0], [0, self.geometry.height],
+                               [self.geometry.width, self.geometry.height]]
+        corners = np.array(self.__absolute_corners(width, height), np.float64).reshape(-1, 1, 2)
+        normalized = cv2.undistortPoints(corners, camera_matrix, distortion).reshape(4, 2)
+        transformation = cv2.getPerspectiveTransform(normalized.astype(np.float32),
+                                                     np.array(transformed_corners, np.float32))
+        return camera_matrix, distortion, transformation
+
+    # Returns the (x, y) scale from a capture resolution to the resolution the corners were picked at
+    def __corners_scale(self, width, height):
+        if not self.corners_resolution:
+            return 1.0, 1.0  # Unknown, assume the corners were picked at this resolution
+        return self.corners_resolution[0] / float(width), self.corners_resolution[1] / float(height)
+
+    # Builds the remap tables for the corner transformation.  initUndistortRectifyMap sends every maze image pixel back
+    # through the inverse transformation and then through the lens distortion, so undistorting and warping the image
+    # take a single cv2.remap.  Without a lens calibration the camera matrix is the identity and there is no
+    # distortion.  The tables are stored in the fixed point format that cv2.remap handles fastest.
+    # frame_size is the (width, height) of the camera images the tables are for
+    def __build_warp_maps(self, frame_size):
+        with self.__corners_lock:
+            identity = np.eye(3)
+            if self.lens is None:
+                camera_matrix, distortion = identity, None
+                transformation = self.__getTransformation(frame_size[0], frame_size[1])
+            else:
+                camera_matrix, distortion, transformation = self.__getLensTransformation(frame_size[0], frame_size[1])
+            map1, map2 = cv2.initUndistortRectifyMap(camera_matrix, distortion, transformation, identity,
+                                                     (self.geometry.width, self.geometry.height), cv2.CV_16SC2)
+            warp_maps = self.__warp_maps = (map1, map2, frame_size)
+        self.reset_background()  # The maze image moved
+        return warp_maps
 
     def __crop_image(self,img):
         if self.corners_set:
-            # Crop image to that which is within corners
-            img = img[self.maze_ROI['row1']: self.maze_ROI['row2'], self.maze_ROI['col1']: self.maze_ROI['col2']]
-            # Transform image
-            transformation = self.__getTransformation()
-            img = cv2.warpPerspective(img, transformation, (PERSPECTIVE_WIDTH, PERSPECTIVE_HEIGHT))
+            frame_size = (img.shape[1], img.shape[0])
+            warp_maps = self.__warp_maps
+            if warp_maps is None or warp_maps[2] != frame_size:
+                warp_maps = self.__build_warp_maps(frame_size)  # Corners or capture resolution changed
+            # Transform the full image to the maze image in one step
+            map1, map2, size = warp_maps
+            img = cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
         else:
             print("Maze Camera: Crop Image Error: corners not set")
 
@@ -15,34 +15,27 @@
 #import solver # This is the maze solver that provides reference position information
 #import sphero_driver
 import time
+import math
 from numpy import *
 import cv2
 import timeit
 import json
-
-PERSPECTIVE_WIDTH = 560		#Pixel Width
-PERSPECTIVE_HEIGHT = 240	#Pixel Height
-ROWS = 4				#The Number of rows in the physical maze
-COLS = 7				#The number of columns in the physical maze
+from latency import Latency_Monitor
+from sphero_tracker import DETECTION_STALE
+from maze_geometry import Maze_Geometry
 
 PID_FILE = 'PID.txt'
+FINISH_COLOR = (0, 0, 255)  # Colour (red, green, blue) the Sphero flashes when it reaches the endpoint
+FINISH_ALTERNATE_COLOR = (0, 255, 0)  # Flashed instead if the Sphero is already lit FINISH_COLOR (LED detector)
 
 #####################################################################
 # The purpose of this code is to take position inputs from the maze
 # solver and give output commands to direct the Sphero as desired
 #####################################################################
 
-def solverToImageCoordinates(solver_Position_Number):
-    # refrence:
-        # positions = set([0,1,2,3,4,5,6,10,11,12,13,14,15,16,20,21,22,23,24,25,26,30,31,32,33,34,35,36])
-        # 10's position represents the rows
-        # 1's position represents the columns
-
-    mazeCheckpointX = (solver_Position_Number % 10) * 2 + 1
-    mazeCheckpointY = (solver_Position_Number // 10) * 2 + 1
-    CheckpointX = PERSPECTIVE_WIDTH / COLS / 2 + mazeCheckpointX//2 * PERSPECTIVE_WIDTH / COLS
-    CheckpointY = PERSPECTIVE_HEIGHT / ROWS / 2 + mazeCheckpointY//2 * PERSPECTIVE_HEIGHT / ROWS
-    return CheckpointX, CheckpointY
+# Returns the maze image point (x, y) at the centre of a solver node (see maze_geometry.py)
+def solverToImageCoordinates(solver_Position_Number, geometry):
+    return geometry.center(solver_Position_Number)
 
 class Maze_Controller:
     def __init__(self, maze_solver):
@@ -60,6 +53,9 @@ class Maze_Controller:
         # Flags
         self.controller_on = False  # Flag is true if the controller is running
 
+        # Time between frame capture, detection, planning and roll commands
+        self.latency = Latency_Monitor()
+
 
     def __del__(self):
         pass
@@ -77,48 +73,64 @@ class Maze_Controller:
 
         while self.controller_on:
             print('starting while')
+            # Capture one frame for solving the maze and locating the Sphero
+            frame = self.maze_solver.camera.get_frame_context()
+            if frame is None:
+                self.__stop_without_frames(sphero)
+                return
             try:
-                remaining_checkpoints = self.maze_solver.solveMaze()
+                remaining_checkpoints = self.maze_solver.solveMaze(frame)
             except Exception as ex:
                 print(ex)
                 print("Maze Unsolvable: Adjust Walls of Maze... Trying again")
                 time.sleep(5)
                 continue
 
+            self.latency.record_frame(frame)
             print("Remaining Checkpoints: " + str(remaining_checkpoints))
 
             if len(remaining_checkpoints) < 1:
                 break
 
             ### Collect X and Y coordinates for checkpoint ###
-            CheckpointX, CheckpointY = solverToImageCoordinates(remaining_checkpoints[0])
+            CheckpointX, CheckpointY = solverToImageCoordinates(remaining_checkpoints[0], self.maze_solver.geometry)
             print("Checkpoint Coordinates: " + str(CheckpointX) + " " + str(CheckpointY))
 
-            coordinates = self.maze_solver.getSpheroCorodinates()
+            coordinates = self.maze_solver.getSpheroCorodinates(frame)
             print("Sphero Coordinates:" + str(self.maze_solver.coord_to_dik_num(coordinates)) + str(coordinates))
+            last_seq = frame.seq  # Sequence number of the last frame used, so no frame is processed twice
 
             # Setup up for PID
             time.sleep(.2)  # Pause a bit
-            previous_error = 0  # Initialize error
             integral = 0  # Initialize integrator
 
-            start_time = time.time()
+            start_time = self.maze_solver.camera.now()  # Frame timebase (a fast replay runs on its recorded time)
+            previous_time = start_time  # Time of the last speed calculation
 
             while self.controller_on:
-                #loop_time = time.time() # Record start time for calculating dt #given up on trying this and commented out dt stuff
                 ### Get Sphero Coordinates ###
-                self.sphero_coordinates = self.maze_solver.getSpheroCorodinates()
+                # Always use the newest frame from the camera (waits for one if the last frame was already used)
+                frame = self.maze_solver.camera.get_frame_context(newer_than=last_seq)
+                if frame is None:
+                    self.__stop_without_frames(sphero)
+                    return
+                last_seq = frame.seq
+                detection = self.maze_solver.getSpheroDetection(frame)  # Adds the frame to the estimate
+                self.sphero_coordinates = detection
                 #print("Sphero Coordinates" + str(self.sphero_coordinates))
 
-                # Check if there is even a Sphero in the maze
-                if (self.sphero_coordinates[0] == 0 and self.sphero_coordinates[1] == 0):
+                # Estimated Sphero position and velocity now, carried forward from the frame capture time
+                now = self.maze_solver.camera.now()
+                estimate = self.maze_solver.getSpheroEstimate(now)
+
+                # Check if there is even a Sphero in the maze (never drive on a stale position)
+                if detection.source == DETECTION_STALE or estimate is None:
                     print('Passing: No sphero found')
                     time.sleep(0.5)
                     continue
 
-                # Break Sphero coordinates into discrete X and Y coordinates
-                x = self.sphero_coordinates[0]
-                y = self.sphero_coordinates[1]
+                # Break the Sphero estimate into discrete X and Y coordinates and velocities
+                x, y, vx, vy = estimate[0]
 
                 # Calculate heading
                 heading = math.atan2(CheckpointY - y, CheckpointX - x)
@@ -134,17 +146,21 @@ class Maze_Controller:
                 #print("DistanceY:" + str(CheckpointY - y) + "," +  str(distance))
                 error = distance  # This distance is the error
 
+                # Time since the last speed calculation
+                self.dt = now - previous_time
+                previous_time = now
 
                 ## PID Controller ##
-                # Derivative Calculations
-                derivative = (error - previous_error) / 0.1 #self.dt
+                # Derivative Calculations: rate the distance is changing, from the estimated velocity
+                if distance > 0:
+                    derivative = -(vx * (CheckpointX - x) + vy * (CheckpointY - y)) / distance
+                else:
+                    derivative = 0
                 # Integral Calculation
                 if derivative < 10:
-                    integral += error * 0.1 #self.dt
+                    integral += error * self.dt
                 # Calculate output speed
                 speed = self.KP_gain/100 * error + self.KI_gain/100 * integral - self.KD_gain/100 * derivative
-                                # Save error
-                previous_error = error
 
                 # Saturation limits for speed
                 if speed > 255:
@@ -165,14 +181,18 @@ class Maze_Controller:
                 # Roll the Sphero in the set heading at the calculated speed
                 if (distance < self.checkpointThreshold):
                     sphero.roll(0, int(heading), 1, False)
+                    frame.mark('command')
+                    self.latency.record_frame(frame)
                     print('Checkpoint!')
                     #print('Loop Time: ',self.dts)
                     break
                 else:
                     sphero.roll(int(speed), int(heading), 1, False)
+                    frame.mark('command')
+                    self.latency.record_frame(frame)
 
                 # If it takes longer than 5 seconds to get to checkpoint, signal timer overflow and start over
-                if time.time() - start_time > 5:
+                if self.maze_solver.camera.now() - start_time > 5:
                     timer_overlap = True
                     print('TIMER OVERFLOW')
                     #print('Loop Time: ', self.dts)
@@ -184,13 +204,22 @@ class Maze_Controller:
 
         # Finished Maze: stop Sphero and make the Sphero flash a different color.
         sphero.roll(0, 0, 0, False)
-        sphero.set_rgb_led(0, 0, 255, 0, False)
+        led_color = tuple(self.maze_solver.spheroLEDColor())
+        red, green, blue = FINISH_COLOR if led_color != tuple(FINISH_COLOR) else FINISH_ALTERNATE_COLOR
+        sphero.set_rgb_led(red, green, blue, 0, False)
         time.sleep(1)
-        sphero.set_rgb_led(0, 0, 0, 0, False)
+        red, green, blue = led_color
+        sphero.set_rgb_led(red, green, blue, 0, False)  # Back to the colour the Sphero is found by
         cv2.waitKey(5)
         print("Navigate Maze Finished")
         self.controller_on = False
 
+    # Stops the Sphero and the controller when the camera gives no frames (closed, or the replay ended)
+    def __stop_without_frames(self, sphero):
+        print("Controller: No camera frames, stopping")
+        sphero.roll(0, 0, 0, False)
+        self.controller_on = False
+
 
 
     # This function will write the current corner values to a text file
@@ -215,7 +244,7 @@ class Maze_Controller:
 
 
 def main():
-    print(solverToImageCoordinates(24))
+    print(solverToImageCoordinates(24, Maze_Geometry()))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,162 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Endpoint Tracker
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Keeps the endpoint (red tile) position between frames and checks it at a low rate
+
+import cv2
+import numpy as np
+
+ENDPOINT_INTERVAL = 1.0  # Seconds between checks of an endpoint that was found where expected
+ENDPOINT_WINDOW = 80  # Half the size of the window (pixels) the endpoint is checked in around its last position
+ENDPOINT_NEAR = 15  # An endpoint found this close (pixels) to its last position has not moved
+ENDPOINT_MAX_MISSES = 3  # Window checks missed in a row before the whole board is searched
+ENDPOINT_SEARCH_INTERVAL = 0.25  # Seconds between whole board searches while the endpoint is missing or moving
+ENDPOINT_CONFIRM = 2  # Detections in a new place in a row before the endpoint is taken to have moved
+ENDPOINT_RATE = 0.5  # Weight of each check in the endpoint confidence
+
+# Parameters for the endpoint blob detector
+params_end = cv2.SimpleBlobDetector_Params()
+params_end.minDistBetweenBlobs = 10
+params_end.filterByColor = True
+params_end.blobColor = 255
+params_end.filterByArea = True
+params_end.minArea = 500
+params_end.maxArea = 6000
+params_end.filterByCircularity = False
+params_end.filterByConvexity = False
+params_end.filterByInertia = False
+params_end.minInertiaRatio = 0.01
+params_end.maxInertiaRatio = 1
+end_detector = cv2.SimpleBlobDetector_create(params_end)
+
+#####################################################################
+# The purpose of this code is to treat the endpoint as a landmark that
+# hardly ever moves.  Once found, its position is kept and returned
+# for every frame; it is only checked every ENDPOINT_INTERVAL
+# seconds, or sooner if something moves over it (see the camera
+# background model), and then only in a window around where it was.
+#
+# Each check raises or lowers the confidence.  A check that misses
+# (the Sphero or a hand is over the tile) never moves the endpoint:
+# it is checked every frame until found again, and after
+# ENDPOINT_MAX_MISSES misses the whole board is searched every
+# ENDPOINT_SEARCH_INTERVAL seconds.  The endpoint only moves once it
+# has been found ENDPOINT_CONFIRM times in a row in the same new place.
+#####################################################################
+
+class Endpoint_Tracker():
+    def __init__(self):
+        self.position = None  # (x, y) of the endpoint in the maze image, None until first found
+        self.confidence = 0.0  # 0 to 1, how well recent checks agree with the position
+        self.misses = 0  # Checks missed in a row
+        self.last_check = None  # Capture time of the last check
+        self.candidate = None  # ((x, y), count) of a new place the endpoint has been found in
+        self.cached = 0  # Number of frames the kept position was used without a check
+        self.window = 0  # Number of window checks
+        self.full = 0  # Number of whole board searches
+
+    # Returns the endpoint (x, y) in a frame, or None if it has never been found
+    def find(self, frame):
+        since = frame.capture_time - self.last_check if self.last_check is not None else None
+        if self.position is None:
+            search = 'full'  # Nothing to keep yet
+        elif self.candidate is not None or self.misses >= ENDPOINT_MAX_MISSES:
+            search = 'full' if since >= ENDPOINT_SEARCH_INTERVAL else None
+        elif self.misses > 0 or since >= ENDPOINT_INTERVAL or self.__covered(frame):
+            search = 'window'
+        else:
+            search = None
+        if search is None:
+            self.cached += 1
+            return self.position
+
+        self.last_check = frame.capture_time
+        if search == 'window':
+            self.window += 1
+            x0, y0, x1, y1 = self.__window(frame)
+            points = [(x + x0, y + y0) for x, y in self.__detect(frame.endpoint_window(x0, y0, x1, y1))]
+        else:
+            self.full += 1
+            points = self.__detect(frame.endpoint())
+        self.__update(points)
+        return self.position
+
+    # Returns true if the foreground (something moving) covers the window around the endpoint
+    def __covered(self, frame):
+        foreground = frame.foreground()
+        if foreground is None:
+            return False
+        x0, y0, x1, y1 = self.__window(frame)
+        return cv2.countNonZero(foreground[y0:y1, x0:x1]) > 0
+
+    # Returns the window (x0, y0, x1, y1) around the endpoint, inside the maze image
+    def __window(self, frame):
+        height, width = frame.gray().shape[:2]
+        x, y = int(self.position[0]), int(self.position[1])
+        return (max(x - ENDPOINT_WINDOW, 0), max(y - ENDPOINT_WINDOW, 0),
+                min(x + ENDPOINT_WINDOW, width), min(y + ENDPOINT_WINDOW, height))
+
+    # Returns the centres (x, y) of the endpoint blobs in an endpoint image
+    @staticmethod
+    def __detect(endpoint_img):
+        return [keypoint.pt for keypoint in end_detector.detect(endpoint_img)]
+
+    # Updates the position and confidence from the endpoints found by a check
+    def __update(self, points):
+        if len(points) > 1:
+            print('Found multiple endpoints')
+        if len(points) == 0:
+            self.misses += 1
+            self.confidence *= 1 - ENDPOINT_RATE
+            return
+        self.misses = 0
+        if self.position is None:
+            self.position, self.confidence = points[0], ENDPOINT_RATE  # Nothing to keep yet
+            return
+
+        # The endpoint found nearest the kept one
+        point = min(points, key=lambda p: np.hypot(p[0] - self.position[0], p[1] - self.position[1]))
+        if np.hypot(point[0] - self.position[0], point[1] - self.position[1]) <= ENDPOINT_NEAR:
+            self.position = point
+            self.confidence += ENDPOINT_RATE * (1 - self.confidence)
+            self.candidate = None
+            return
+
+        # Found somewhere else; only moved once it is found there again
+        self.confidence *= 1 - ENDPOINT_RATE
+        if self.candidate is not None and np.hypot(point[0] - self.candidate[0][0],
+                                                   point[1] - self.candidate[0][1]) <= ENDPOINT_NEAR:
+            self.candidate = (point, self.candidate[1] + 1)
+        else:
+            self.candidate = (point, 1)
+        if self.candidate[1] >= ENDPOINT_CONFIRM:
+            print('Endpoint moved')
+            self.position, self.confidence = point, ENDPOINT_RATE
+            self.candidate = None
+
+    # Forgets the endpoint (the maze image changed)
+    def reset(self):
+        self.position = None
+        self.confidence = 0.0
+        self.misses = 0
+        self.candidate = None
+
+    # Returns a dictionary of how often the endpoint was checked
+    def stats(self):
+        frames = self.cached + self.window + self.full
+        return {'frames': frames, 'cached': self.cached, 'window': self.window, 'full': self.full,
+                'confidence': self.confidence}
+
+    def print_report(self):
+        stats = self.stats()
+        print("Endpoint Tracker: {} frames, {} cached, {} window checks, {} full board, confidence {:.2f}".format(
+            stats['frames'], stats['cached'], stats['window'], stats['full'], stats['confidence']))
@@ -0,0 +1,309 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Frame Sources
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Recorder and replay source for camera frames
+# 2.  In-memory still image source for running without a camera
+
+import cv2
+import os
+import time
+import queue
+import struct
+import threading
+import numpy as np
+
+RECORDING_MAGIC = b'SPHEROMAZE-FRAMES-1\n'  # First bytes of every recording file
+RECORD_HEADER = struct.Struct('<dI')  # Per frame header: capture timestamp (seconds), size of the encoded image
+RECORD_IMAGE_FORMAT = '.jpg'  # Image encoding used for recorded frames
+RECORD_JPEG_QUALITY = 95  # JPEG quality used for recorded frames
+RECORD_QUEUE_SIZE = 30  # Frames waiting to be written; when the disk falls this far behind, new frames are dropped
+
+#####################################################################
+# The purpose of this code is to provide sources of camera frames
+# other than the webcam, so that the maze code can be run and
+# benchmarked without the maze hardware.
+#
+# A recording is a single file: RECORDING_MAGIC followed by one
+# record per frame (RECORD_HEADER, then the encoded image).  The
+# per frame headers let a reader find any frame by seeking over the
+# images, so the file can be read back from any point without an
+# index, even if the recording was cut short.
+#####################################################################
+
+# Writes timestamped camera frames to a recording file.  Frames are encoded and written by a writer thread, so
+# recording adds no encoding or disk time to the capture thread that hands them over.
+class Frame_Recorder():
+    def __init__(self, filename, image_format=RECORD_IMAGE_FORMAT, quality=RECORD_JPEG_QUALITY):
+        self.filename = filename
+        self.image_format = image_format
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality] if image_format == '.jpg' else []
+        self.frames_written = 0
+        self.frames_dropped = 0  # Frames not recorded because the writer thread was too far behind
+        self.error = None  # Error that stopped the writer thread, raised by the next write()
+        self.lock = threading.Lock()  # write() runs on the capture thread, close() can come from the GUI thread
+        self.file = open(filename, 'wb')
+        self.file.write(RECORDING_MAGIC)
+        self.__queue = queue.Queue(RECORD_QUEUE_SIZE)  # (image, timestamp) waiting to be written, None once closed
+        self.__writer = threading.Thread(target=self.__write_frames, args=(self.__queue,), name="Frame Recorder")
+        self.__writer.daemon = True
+        self.__writer.start()
+        print("Frame Recorder: Recording frames to", filename)
+
+    # Queues one frame to be recorded; timestamp is the capture time of the frame (time.time()).  The image must not be
+    # changed afterwards.  Never waits: if the queue is full the frame is dropped.
+    def write(self, img, timestamp):
+        if self.error is not None:
+            raise self.error
+        with self.lock:
+            if self.__queue is None:
+                return  # Closed
+            try:
+                self.__queue.put_nowait((img, timestamp))
+            except queue.Full:
+                self.frames_dropped += 1
+
+    # Writer thread loop: encode and append each queued frame until close()
+    def __write_frames(self, frames):
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # Failed, drain the queue until close()
+            img, timestamp = item
+            try:
+                ret, data = cv2.imencode(self.image_format, img, self.encode_params)
+                if not ret:
+                    print("Frame Recorder: failed to encode frame")
+                    continue
+                self.file.write(RECORD_HEADER.pack(timestamp, len(data)))
+                self.file.write(data.tobytes())
+                self.frames_written += 1
+            except Exception as error:
+                self.error = error
+
+    # Writes the frames still queued and closes the file
+    def close(self):
+        with self.lock:
+            frames, self.__queue = self.__queue, None
+        if frames is None:
+            return  # Already closed
+        frames.put(None)  # After every frame queued so far
+        self.__writer.join()
+        self.file.close()
+        self.file = None
+        if self.frames_dropped:
+            print("Frame Recorder: Dropped", self.frames_dropped, "frames, the disk could not keep up")
+        print("Frame Recorder: Saved", self.frames_written, "frames to", self.filename)
+
+
+# Plays back a recording file.  It has the same interface as the cv2.VideoCapture calls used by the maze camera
+# (isOpened, read, set, get, release), so it can be used in place of the webcam.
+# realtime is a bool flag, if true frames are handed out at the speed they were recorded; otherwise read() returns
+# the next frame straight away.  loop is a bool flag, if true the recording starts over when it runs out.
+class Replay_Capture():
+    def __init__(self, filename, realtime=True, loop=False):
+        self.filename = filename
+        self.realtime = realtime
+        self.loop = loop
+        self.offsets = []  # File offset of each encoded image
+        self.sizes = []  # Size of each encoded image
+        self.timestamps = []  # Recorded capture time of each frame
+        self.position = 0  # Index of the next frame to read
+        self.frame_time = 0  # Recorded capture time of the last frame read
+        self.__replay_start = None  # (wall clock time, recorded time) when realtime playback started
+        self.file = None
+        try:
+            self.file = open(filename, 'rb')
+            if self.file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise IOError("not a maze recording")
+            self.__index_frames()
+            print("Replay: Loaded", len(self.offsets), "frames from", filename)
+        except Exception as error:
+            print("Replay: Failed to open recording", filename, "for the following reason:")
+            print(error)
+            self.release()
+
+    # Reads the per frame headers, seeking over the images, to find where each frame is
+    def __index_frames(self):
+        while True:
+            header = self.file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            timestamp, size = RECORD_HEADER.unpack(header)
+            self.offsets.append(self.file.tell())
+            self.sizes.append(size)
+            self.timestamps.append(timestamp)
+            self.file.seek(size, 1)
+        # Drop a last frame that was cut short (seeking past the end of the file does not fail)
+        self.file.seek(0, 2)
+        end = self.file.tell()
+        while self.offsets and self.offsets[-1] + self.sizes[-1] > end:
+            self.offsets.pop()
+            self.sizes.pop()
+            self.timestamps.pop()
+
+    def isOpened(self):
+        return self.file is not None and len(self.offsets) > 0
+
+    # Number of frames in the recording
+    def frame_count(self):
+        return len(self.offsets)
+
+    # Moves playback to frame index
+    def seek(self, index):
+        self.position = max(0, min(int(index), len(self.offsets)))
+        self.__replay_start = None
+
+    # Returns true once every frame has been read (never for a looping recording)
+    def finished(self):
+        return not self.isOpened() or (not self.loop and self.position >= len(self.offsets))
+
+    # In realtime playback, waits until the next frame is due, measured from when playback started.  read() waits
+    # too; calling this first lets a caller wait without holding the lock it reads the capture under.
+    def wait(self):
+        if not self.realtime or self.finished():
+            return
+        if self.position >= len(self.offsets):
+            self.seek(0)
+        timestamp = self.timestamps[self.position]
+        if self.__replay_start is None:
+            self.__replay_start = (time.time(), timestamp)
+        delay = self.__replay_start[0] + (timestamp - self.__replay_start[1]) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Returns (ret, img) like cv2.VideoCapture.read
+    def read(self):
+        if self.finished():
+            return False, None
+        self.wait()
+        if self.position >= len(self.offsets):
+            self.seek(0)  # Looping
+
+        timestamp = self.timestamps[self.position]
+        self.file.seek(self.offsets[self.position])
+        data = np.frombuffer(self.file.read(self.sizes[self.position]), np.uint8)
+        self.position += 1
+        self.frame_time = timestamp
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return img is not None, img
+
+    # Camera settings do not apply to a recording; only the playback position can be set
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.seek(value)
+            return True
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.offsets)
+        return 0
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# Serves still images (a single image or an image sequence) from memory, for running without a camera.  The images
+# are decoded once into one preallocated buffer, so reading a frame costs nothing but handing out a (read only) view of
+# it.  If cache is the name of a .npy file, the decoded images are saved to it and memory mapped on later runs instead
+# of being decoded again.  Sequences are played in order and start over at the end.
+# Has the same interface as Replay_Capture.
+class Image_Source():
+    def __init__(self, filenames, cache=None):
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        self.filenames = list(filenames)
+        self.position = 0  # Index of the next image to read
+        self.frame_time = 0  # Time the last image was read
+        self.frames = None  # Buffer holding every decoded image
+        try:
+            self.frames = self.__load_cache(cache)
+            if self.frames is None:
+                self.frames = self.__decode_images()
+                self.__save_cache(cache)
+            self.frames.flags.writeable = False  # Frames are shared, consumers must copy before drawing on them
+            print("Image Source: Loaded", len(self.frames), "image(s)")
+        except Exception as error:
+            print("Image Source: Failed to load images for the following reason:")
+            print(error)
+            self.frames = None
+
+    # Decodes every image into one preallocated buffer.  All images must be the same size.
+    def __decode_images(self):
+        frames = None
+        for i, filename in enumerate(self.filenames):
+            img = cv2.imread(filename, cv2.IMREAD_COLOR)
+            if img is None:
+                raise IOError("unable to read " + filename)
+            if frames is None:
+                frames = np.empty((len(self.filenames),) + img.shape, np.uint8)
+            frames[i] = img
+        return frames
+
+    # Returns the memory mapped images from the cache file, or None if there is no cache or it is out of date
+    def __load_cache(self, cache):
+        if cache is None or not os.path.exists(cache):
+            return None
+        cache_time = os.path.getmtime(cache)
+        if any(os.path.getmtime(filename) > cache_time for filename in self.filenames):
+            return None  # An image changed since the cache was made
+        frames = np.load(cache, mmap_mode='r')
+        if len(frames) != len(self.filenames):
+            return None
+        return frames
+
+    def __save_cache(self, cache):
+        if cache is not None:
+            np.save(cache, self.frames)
+
+    def isOpened(self):
+        return self.frames is not None and len(self.frames) > 0
+
+    # Number of images
+    def frame_count(self):
+        return len(self.frames) if self.frames is not None else 0
+
+    # Moves to image index
+    def seek(self, index):
+        self.position = int(index) % max(1, self.frame_count())
+
+    # Returns (ret, img) like cv2.VideoCapture.read
+    def read(self):
+        if not self.isOpened():
+            return False, None
+        img = self.frames[self.position]
+        self.position = (self.position + 1) % len(self.frames)
+        self.frame_time = time.time()
+        return True, img
+
+    # Camera settings do not apply to still images
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.seek(value)
+            return True
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count()
+        return 0
+
+    def release(self):
+        self.frames = None
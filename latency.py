@@ -0,0 +1,116 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Latency Monitor
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Histograms of the time between the stages of the control loop
+
+import bisect
+import threading
+
+# Stages a frame goes through, in order.  Each frame context is stamped (time.time()) as it reaches a stage.
+#   capture:  the camera delivered the frame
+#   acquired: the frame was handed to the code that uses it
+#   detected: the Sphero was located in the frame
+#   planned:  the maze was solved from the frame
+#   command:  a roll command based on the frame was sent to the Sphero
+LATENCY_STAGES = ['capture', 'acquired', 'detected', 'planned', 'command']
+# Histogram bin edges (seconds): 50 microseconds to about 50 seconds, 4 bins per doubling
+LATENCY_BIN_EDGES = [0.00005 * 2 ** (i / 4.0) for i in range(81)]
+
+#####################################################################
+# The purpose of this code is to show where the time goes between a
+# frame being captured and a roll command being sent.  Recording a
+# time only adds one to a histogram bin, so it is cheap enough to run
+# on every frame.
+#####################################################################
+
+# Histogram of times with fixed, logarithmically spaced bins
+class Latency_Histogram():
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(LATENCY_BIN_EDGES) + 1)  # Last bin holds everything past the last edge
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # Add a time (seconds)
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BIN_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Returns the time (seconds) below which fraction (0 to 1) of the recorded times fall, to within one bin
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, bin_count in enumerate(self.counts):
+            seen += bin_count
+            if seen >= target and bin_count > 0:
+                return min(LATENCY_BIN_EDGES[i], self.max) if i < len(LATENCY_BIN_EDGES) else self.max
+        return self.max
+
+    # Returns a dictionary of count, mean, median, 90%, 99% and max (seconds)
+    def summary(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(0.5),
+                'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99),
+                'max': self.max}
+
+
+# Keeps a histogram for the time between each pair of consecutive stages a frame reached, and one for the whole
+# time from capture to the last stage reached
+class Latency_Monitor():
+    def __init__(self):
+        self.histograms = {}  # Histograms by name ("capture->detected", ...)
+        self.lock = threading.Lock()
+
+    # Add a time (seconds) to the named histogram
+    def record(self, name, seconds):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Latency_Histogram(name)
+            self.histograms[name].record(seconds)
+
+    # Record the time between the stages of a frame context (uses its stamps)
+    def record_frame(self, frame):
+        reached = [stage for stage in LATENCY_STAGES if stage in frame.stamps]
+        for first, second in zip(reached, reached[1:]):
+            self.record(first + "->" + second, frame.stamps[second] - frame.stamps[first])
+        if len(reached) > 2:
+            self.record(reached[0] + "->" + reached[-1], frame.stamps[reached[-1]] - frame.stamps[reached[0]])
+
+    # Returns a dictionary of histogram summaries by name
+    def summary(self):
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    # Prints a table of the histogram summaries (milliseconds)
+    def print_report(self):
+        summary = self.summary()
+        if not summary:
+            print("Latency: nothing recorded")
+            return
+        print("Latency (ms)                   count     mean      50%      90%      99%      max")
+        for name in sorted(summary):
+            s = summary[name]
+            print("{:<28} {:>7} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}".format(
+                name, s['count'], s['mean'] * 1000, s['p50'] * 1000, s['p90'] * 1000, s['p99'] * 1000,
+                s['max'] * 1000))
@@ -0,0 +1,109 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Maze Geometry
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Maze grid size, maze image size and the cell / pixel / node conversions in one place
+
+import json
+import os
+
+MAZE_GEOMETRY_FILE = "mazeGeometry.txt"  # Grid and maze image size, if the maze is not the standard one
+MAZE_ROWS = 4  # The number of rows in the physical maze
+MAZE_COLS = 7  # The number of columns in the physical maze
+MAZE_WIDTH = 560  # Width of the maze image (pixels) the camera image is transformed to
+MAZE_HEIGHT = 240  # Height of the maze image (pixels)
+
+#####################################################################
+# The purpose of this code is to describe the maze grid once for the
+# camera, the solver and the controller.  The camera transforms its
+# image to width x height pixels, which is divided into rows x cols
+# cells.  A cell is (row, col), counted from the top left; its node
+# (the number the path finder uses) is row * cols + col, so the nodes
+# are 0 to rows * cols - 1 for any size of maze.
+#
+# The maze matrix used by the solver is (2 * rows + 1) x
+# (2 * cols + 1): cell (row, col) is at [2 * row + 1, 2 * col + 1]
+# and the edges between cells are the entries between them.
+#
+# For a different maze, write mazeGeometry.txt as
+#   {"rows": 4, "cols": 7, "width": 560, "height": 240}
+# keeping width / cols and height / rows whole numbers of pixels.
+# Keep the standard cell size (80 x 60 pixels) too: the Sphero circle
+# search radii and the endpoint blob areas are set in pixels.
+#####################################################################
+
+class Maze_Geometry():
+    def __init__(self, rows=MAZE_ROWS, cols=MAZE_COLS, width=MAZE_WIDTH, height=MAZE_HEIGHT):
+        self.rows = rows
+        self.cols = cols
+        self.width = width  # Maze image width (pixels)
+        self.height = height  # Maze image height (pixels)
+        self.cell_width = width // cols  # Whole pixels per cell
+        self.cell_height = height // rows
+        self.nodes = rows * cols  # Number of cells (nodes are 0 to nodes - 1)
+
+    # Returns the geometry in the geometry file, or the standard maze if there is no file
+    @staticmethod
+    def load(filename=MAZE_GEOMETRY_FILE):
+        if not os.path.exists(filename):
+            return Maze_Geometry()
+        try:
+            with open(filename) as f:
+                values = json.load(f)
+            rows, cols, width, height = (int(values[key]) for key in ('rows', 'cols', 'width', 'height'))
+            if rows <= 0 or cols <= 0 or width < cols or height < rows:
+                raise ValueError("the maze needs at least one row and column, and a pixel per cell")
+            geometry = Maze_Geometry(rows, cols, width, height)
+            print("Maze Geometry: Loaded", geometry.rows, "x", geometry.cols, "maze from file")
+            if (geometry.cell_width, geometry.cell_height) != (MAZE_WIDTH // MAZE_COLS, MAZE_HEIGHT // MAZE_ROWS):
+                print("Maze Geometry: Warning: cells are", geometry.cell_width, "x", geometry.cell_height,
+                      "pixels; the Sphero and endpoint sizes are set for", MAZE_WIDTH // MAZE_COLS, "x",
+                      MAZE_HEIGHT // MAZE_ROWS)
+            return geometry
+        except (ValueError, KeyError, TypeError) as error:
+            print("Maze Geometry: Unable to load the maze size from " + filename + ", using the standard maze")
+            print(error)
+            return Maze_Geometry()
+
+    def save(self, filename=MAZE_GEOMETRY_FILE):
+        with open(filename, "w") as f:
+            json.dump({'rows': self.rows, 'cols': self.cols, 'width': self.width, 'height': self.height}, f)
+
+    # Returns the node of a cell
+    def node(self, row, col):
+        return row * self.cols + col
+
+    # Returns the cell (row, col) of a node
+    def cell(self, node):
+        return divmod(int(node), self.cols)
+
+    # Returns the cell (row, col) a maze image point (x, y) is in (points off the maze are put in the nearest cell)
+    def cell_at(self, x, y):
+        row = min(max(int(y * self.rows / self.height), 0), self.rows - 1)
+        col = min(max(int(x * self.cols / self.width), 0), self.cols - 1)
+        return row, col
+
+    # Returns the node a maze image point (x, y) is in
+    def node_at(self, x, y):
+        return self.node(*self.cell_at(x, y))
+
+    # Returns the maze image point (x, y) at the centre of a node
+    def center(self, node):
+        row, col = self.cell(node)
+        return (col + 0.5) * self.width / self.cols, (row + 0.5) * self.height / self.rows
+
+    # Returns the maze matrix index [row, col] of a cell
+    def matrix_index(self, row, col):
+        return [2 * row + 1, 2 * col + 1]
+
+    # Returns the size (rows, cols) of the maze matrix
+    def matrix_shape(self):
+        return 2 * self.rows + 1, 2 * self.cols + 1
@@ -13,6 +13,12 @@
 # 1.  Prototype for the main block of the Sphero Maze Runner
 DEBUG_NO_SPHERO = False
 DEBUG_NO_CAM = False
+DEBUG_REPLAY_FILE = None  # Set to a recording file name to play it back instead of using the camera
+DEBUG_REPLAY_REALTIME = True  # Play the recording at its original speed (False: as fast as frames are asked for,
+                              # the controller then runs on the recorded capture times)
+AUTO_EXPOSURE = False  # Keep adjusting the camera exposure and brightness to the room lighting in the background
+TRACK_CORNERS = False  # Keep checking for the maze board moving in the camera image and update the corners
+SPHERO_ODOMETRY = False  # Stream the Sphero odometry and add it to the Sphero estimate between camera frames
 
 if DEBUG_NO_SPHERO:
     print("No Sphero")
@@ -36,7 +42,11 @@ class Application:
         self.sphero = sphero_driver.Sphero
 
         # Maze Camera
-        self.camera = Maze_Camera(nocam = DEBUG_NO_CAM)
+        self.camera = Maze_Camera(nocam = DEBUG_NO_CAM, replay = DEBUG_REPLAY_FILE, realtime = DEBUG_REPLAY_REALTIME)
+        if AUTO_EXPOSURE and not DEBUG_NO_CAM and DEBUG_REPLAY_FILE is None:
+            self.camera.start_auto_exposure()
+        if TRACK_CORNERS and not DEBUG_NO_CAM and DEBUG_REPLAY_FILE is None:
+            self.camera.start_corner_tracking()
 
         # Maze Solver
         self.maze_solver = Maze_Solver(self.camera)
@@ -80,10 +90,18 @@ class Application:
                 print("GUI not found")
                 exit()
 
+            # One frame is shared by all of the debug feeds; images nobody asks for are never made
+            # The flags are read once: the GUI callbacks can set them while this loop runs
+            live_feed, maze_feed, sphero_feed = self.live_feed, self.maze_feed, self.sphero_feed
+            frame = None
+            if live_feed or maze_feed or sphero_feed:
+                frame = self.camera.get_frame_context()
+                if frame is None:
+                    live_feed = maze_feed = sphero_feed = False  # No camera frame to show
+
             # Live feed
-            if self.live_feed:
-                image = self.camera.get_image_unfiltered()
-                cv2.imshow("Live Feed", image)
+            if live_feed:
+                cv2.imshow("Live Feed", frame.raw)
                 cv2.waitKey(5)
             if self.destroy_feed_window:
                 cv2.destroyWindow("Live Feed")
@@ -91,19 +109,21 @@ class Application:
                 self.destroy_feed_window = False
 
             # Maze feed
-            if self.maze_feed:
-                self.maze_solver.findMazeMatrix()
-                cv2.imshow("Maze Walls", self.maze_solver.wall_img_debug)
-                cv2.waitKey(5)
+            if maze_feed:
+                self.maze_solver.findMazeMatrix(frame)
+                wall_img = self.maze_solver.wall_img_debug
+                if wall_img is not None:
+                    cv2.imshow("Maze Walls", wall_img)
+                    cv2.waitKey(5)
             if self.destroy_maze_window:
                 cv2.destroyWindow("Maze Walls")
                 cv2.waitKey(5)
                 self.destroy_maze_window = False
 
             # Maze feed
-            if self.sphero_feed:
-                coordinates = self.maze_solver.getSpheroCorodinates()
-                image = self.camera.get_image_unfiltered(True)
+            if sphero_feed:
+                coordinates = self.maze_solver.getSpheroCorodinates(frame)
+                image = frame.image().copy()  # Copy so the drawing does not end up in the shared frame
                 cv2.circle(image, (int(coordinates[0]), int(coordinates[1])), 35, (255, 255, 255), 3)
                 cv2.imshow("Sphero Position",image)
                 cv2.waitKey(5)
@@ -138,6 +158,13 @@ class Application:
         if self.sphero_feed == False:
             self.destroy_sphero_window = True
 
+    ### Recording ###
+    def toggle_recording(self):
+        if self.camera.is_recording():
+            self.camera.stop_recording()
+        else:
+            self.camera.start_recording()
+
     ### Sphero Commands ###
 
     # Connect to a Sphero device.
@@ -181,7 +208,10 @@ class Application:
             self.sphero.set_heading(0, False)  # Set heading
             self.sphero.set_stablization(1, False)  # Unlock gyro
             self.sphero.set_back_led(0, False)  # Turn off orienting LED
-            self.sphero.set_rgb_led(0, 0, 0, 0, False)  # Set Sphero Color
+            red, green, blue = self.maze_solver.spheroLEDColor()
+            self.sphero.set_rgb_led(red, green, blue, 0, False)  # Set Sphero Color (lit if found by its LED)
+            if SPHERO_ODOMETRY:
+                self.maze_solver.odometry.start(self.sphero)  # Stream the locator and velocity for the Sphero estimate
 
             self.sphero_connected = True  # Set flag
             print("Sphero Connected")
@@ -200,6 +230,7 @@ class Application:
         # Disconnect if
         if self.sphero_connected and not self.sphero_orienting:  # Check if there is a Sphero connected
             self.sphero.set_back_led(0, False)  # Turn off blue orienting led
+            self.maze_solver.odometry.stop(self.sphero)  # Stop streaming (if it was started)
             self.sphero.disconnect()  # Disconnect from Sphero
             self.GUI.sphero_connection_changed()  # Trigger update
             self.sphero_connected = False  # Change flag
@@ -217,6 +248,9 @@ class Application:
                 self.sphero.set_heading(0, False)  # Reset heading to direction of blue led
                 self.sphero.set_stablization(1, False)  # Unlock Sphero gyros
                 self.sphero.set_back_led(0, False)  # Turn off blue led
+                if self.maze_solver.odometry.streaming:
+                    self.maze_solver.odometry.stop(self.sphero)  # The heading changed, match the odometry to the camera again
+                    self.maze_solver.odometry.start(self.sphero)
                 self.sphero_orienting = False  # Set flag to unlock function
 
         # Try to orient the Sphero if it is connected
@@ -241,6 +275,12 @@ class Application:
         self.calibrating_filters = False
 
 
+    def calibrate_lens(self):
+        print("Calibrate Lens")  # Call camera lens calibration command
+        self.calibrating_filters = True
+        self.camera.calibrate_lens()
+        self.calibrating_filters = False
+
     def calibrate_camera(self):
         print("Calibrate Camera")  # Create Settings GUI for camera exposure and brightness
         self.newWindow_camera_settings = tk.Toplevel(self.root)
@@ -278,6 +318,11 @@ class Application:
     def quit_program(self):
         # Clean up flags
         self.running = False
+        self.camera.close_camera()
+        self.controller.latency.print_report()
+        self.maze_solver.tracker.print_report()
+        if SPHERO_ODOMETRY:
+            self.maze_solver.odometry.print_report()
         cv2.destroyAllWindows()
         time.sleep(0.2)
         sys.exit()
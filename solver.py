@@ -2,164 +2,408 @@ import dijkstra
 from collections import defaultdict
 import cv2
 import numpy as np
-import collections
+import threading
+import time
+from sphero_tracker import Sphero_Tracker, LED_Detector, Multi_Sphero_Tracker, LED_COLOR
+from sphero_tracker import Sphero_Detection, refine_circle, DETECTION_FRESH, DETECTION_PREDICTED, DETECTION_STALE
+from sphero_estimator import Sphero_Estimator, ESTIMATOR_MEASUREMENT
+from sphero_odometry import Sphero_Odometry
+from endpoint_tracker import Endpoint_Tracker
 
 FILTER_THRESHOLD = 15000
-PERSPECTIVE_WIDTH = 560		#Pixel Width
-PERSPECTIVE_HEIGHT = 240	#Pixel Height
-ROWS = 4				#The Number of rows in the physical maze
-COLS = 7				#The number of columns in the physical maze
-PREVIOUS_SPHERO_COORD = [PERSPECTIVE_WIDTH//2,PERSPECTIVE_HEIGHT//2,1]
-
-# Parameters for the endpoint blob detector
-params_end = cv2.SimpleBlobDetector_Params()
-params_end.minDistBetweenBlobs = 10
-params_end.filterByColor = True
-params_end.blobColor = 255
-params_end.filterByArea = True
-params_end.minArea = 500
-params_end.maxArea = 6000
-params_end.filterByCircularity = False
-params_end.filterByConvexity = False
-params_end.filterByInertia = False
-params_end.minInertiaRatio = 0.01
-params_end.maxInertiaRatio = 1
-end_detector = cv2.SimpleBlobDetector_create(params_end)
+FILTER_THRESHOLD_AREA = 1200	#Wall rectangle size (pixels) FILTER_THRESHOLD is for, it is scaled for other cell sizes
+SPHERO_DETECTOR = 'hough'	#How the Sphero is found: 'hough' (circle search, Sphero unlit) or 'led' (LED colour search)
+EDGE_RATE = 0.5	#Weight of each new frame in an edge's confidence, a moved wall shows after two frames
+EDGE_OPEN = 0.7	#A closed edge opens (its wall was removed) when its confidence rises above this
+EDGE_CLOSE = 0.3	#An open edge closes (a wall was placed) when its confidence falls below this
+EDGE_UNCERTAIN_COST = 1.0	#Extra path cost of an open edge with no confidence (paths avoid newly opened edges)
+OCCLUSION_MIN_CELLS = 0.5	#Foreground blobs at least this many cells in size (hands) hide the walls under them
+OCCLUSION_MIN_VISIBLE = 0.25	#An edge with less of its wall rectangle than this fraction visible keeps its state
+MOVING_CELL_FRACTION = 0.15	#Fraction of a maze cell that must differ from the empty board for something to be moving there
+MOVING_SPHERO_MARGIN = 1.5	#The Sphero (this many times its radius) is left out of the moving cells
 
 class Maze_Solver():
-	def __init__(self, camera):
+	def __init__(self, camera, detector = SPHERO_DETECTOR):
 		self.camera = camera
-		self.previous_sphero_coords = [0,0]
-		self.previous_mazes = collections.deque(maxlen = 5)
-
-	def getSpheroCorodinates(self):
-		img = self.camera.get_image_unfiltered(True)
-
-		GRAY = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-		circles = cv2.HoughCircles(GRAY, cv2.HOUGH_GRADIENT, 1.5, 75, param1=500, param2=30, minRadius=10, maxRadius=30)
-
-		if circles is None or len(circles)== 0 or circles[0][0][0] == 0 :
-			#print ('No Sphero Found on Image')
-			return self.previous_sphero_coords
+		self.geometry = camera.geometry	#Maze grid and maze image size (see maze_geometry.py)
+		self.detector = detector
+		self.last_detection = Sphero_Detection(0, 0, 0, 0.0, DETECTION_STALE, 0)	#Last time the Sphero was found
+		self.edge_confidence = None	#(horizontal, vertical) confidence (0 to 1) each edge is open, as in scoreWalls
+		self.__edge_open = None	#(horizontal, vertical) true for each edge that is open
+		if detector == 'led':
+			self.tracker = LED_Detector()	#Finds the Sphero by the colour of its LED
 		else:
-			if len(circles[0]) > 1:
-				#print ('Found Multiple Circles: ' + str(circles))
-				return self.previous_sphero_coords
-			self.previous_sphero_coords = circles[0][0]
-			return circles[0][0]
-
-	def getStartPoint(self):
-		c = self.getSpheroCorodinates()
-		return [2*int(c[1]*ROWS/PERSPECTIVE_HEIGHT)+1, 2*int(c[0]*COLS/PERSPECTIVE_WIDTH)+1]
-
-	def findEndMarker(self):
-		endPoint_img = self.camera.get_image_endpoint_filtered(True)
-		keypoints = end_detector.detect(endPoint_img)
-
-		if len(keypoints)>1:
-			print ('Found multiple endpoints')
-		if len(keypoints) == 0:
-			print ('No Endpoint found, routing to top left corner')
-			return (0,0)
-		return keypoints[0].pt
-
-	def getEndPoint(self):
-		c = self.findEndMarker()
-		return [2*int(c[1]*ROWS/PERSPECTIVE_HEIGHT)+1, 2*int(c[0]*COLS/PERSPECTIVE_WIDTH)+1]
-
-
-	def findMazeMatrix(self):
-		walls_img = np.array(self.camera.get_image_wall_filtered(True))
-		sphero_coordinates = self.getSpheroCorodinates()
-
-		maze = np.zeros((2 * ROWS + 1, 2 * COLS + 1))
-		maze[1:ROWS * 2:2, 1:COLS * 2:2] = 1
-
-		self.wall_img_debug = walls_img.copy()
-
-		colW = int(PERSPECTIVE_WIDTH / COLS)
-		rowH = int(PERSPECTIVE_HEIGHT / ROWS)
-
-		for r in range(ROWS):
-			for c in range(COLS):
-				x_curr = int(colW / 2 + c * colW)
-				y_curr = int(rowH / 2 + r * rowH)
-				x_next = int(x_curr + colW)
-				y_next = int(y_curr + rowH)
-
-				if c != COLS - 1:
-					#adds boxes to debug image for refrence and allignment checking (slightly shrunk to see individual boxes)
-					#cv2.rectangle(self.wall_img_debug,(x_curr + colW//4 , y_curr - rowH//5) , (x_next - colW//4 , y_curr + rowH//5),100)
-
-					#checks a rectangle for number of pixels, if above threshold it will assume there is a wall
-					temp = np.sum(walls_img[y_curr - rowH//4:y_curr + rowH//4, x_curr + colW//4:x_next - colW//4])
-					if temp < FILTER_THRESHOLD: #smaller dots should be less than FILTER_THRESHOLD and walls should be bigger
-						maze[r * 2 + 1, c * 2 + 2] = 1 #no wall here
-						cv2.line(self.wall_img_debug,(x_curr, y_curr), (x_next, y_curr), 200) #draws valid sphero paths on debug image
-
-				#same as above except no comments
-				if r != ROWS - 1:
-					#cv2.rectangle(self.wall_img_debug,(x_curr + colW//5 , y_curr + rowH//4) , (x_curr - colW//5 , y_next - rowH//4),100)
-					temp = np.sum(walls_img[y_curr + rowH//4:y_next - rowH//4, x_curr - colW//4:x_curr + colW//4])
-					if temp < FILTER_THRESHOLD:
-						maze[r * 2 + 2, c * 2 + 1] = 1
-						cv2.line(self.wall_img_debug,(x_curr, y_curr), (x_curr, y_next), 200)
-
+			self.tracker = Sphero_Tracker()	#Searches near the last Sphero position before the whole board
+		self.estimator = Sphero_Estimator()	#Sphero position and velocity from the timestamped detections
+		self.odometry = Sphero_Odometry(self.estimator)	#Sphero velocities streamed from the Sphero, once started
+		self.multi_tracker = Multi_Sphero_Tracker()	#Several Spheros at once, added with addSphero
+		self.endpoint = Endpoint_Tracker()	#Endpoint position, kept between frames and checked at a low rate
+		self.__edge_rectangles = self.__wall_rectangles()	#Rectangles checked for walls, the same for every frame
+		self.__rectangle_areas = [(bottom - top) * (right - left)
+			for top, bottom, left, right in self.__edge_rectangles]	#Pixels in each wall rectangle, horizontal, vertical
+		self.__wall_thresholds = [FILTER_THRESHOLD * area / FILTER_THRESHOLD_AREA for area in self.__rectangle_areas]
+		self.__wall_debug_frame = None	#(frame, edges seen) of the last findMazeMatrix, for wall_img_debug
+		self.maze = None	#Published maze matrix (1 for cells and open edges), only replaced when an edge flips
+		self.maze_version = 0	#Counts the times an edge of the published maze has flipped
+		self.changed_edges = []	#Maze matrix indices [row, col] of the edges that flipped in the latest version
+		self.__plan = None	#(maze version, end node, shortest path tree to the end), reused while the maze is unchanged
+		self.__route = None	#(maze version, start node, end node, checkpoints) of the last solveMaze
+		#The controller thread and the GUI debug feeds both use the solver.  The lock keeps the edges, trackers and plan
+		#consistent, and each frame (by sequence number) is only added to them once, however many contexts it is in.
+		self.__lock = threading.RLock()
+		self.__detection_seq = (-1, None)	#(frame sequence number, Sphero_Detection or None) of the newest detection
+		self.__positions_seq = (-1, {})	#(frame sequence number, positions) of the newest getSpheroPositions
+		self.__edges_seq = -1	#Sequence number of the newest frame added to the edge confidence
+		self.__endpoint_seq = -1	#Sequence number of the newest frame the endpoint was looked for in
+
+	# frame is a frame context from the camera; if none is given a new frame is captured
+	# Returns a Sphero_Detection, which can be indexed like the circle ([x, y, radius]) this used to return
+	def getSpheroCorodinates(self, frame = None):
+		return self.getSpheroDetection(frame)
+
+	# Returns where the Sphero is in a frame as a Sphero_Detection: found in the frame (fresh), predicted from the
+	# Sphero estimate if it was not found (predicted), or else the last position found (stale)
+	def getSpheroDetection(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+
+		# The circle search is only run once per frame, however many times the Sphero is asked for
+		detection = frame.product('sphero_detection', lambda: self.__detect(frame))
+		if detection is not None:
+			return detection
+
+		estimate = self.estimator.estimate(frame.capture_time)
+		if estimate is not None:
+			state, covariance = estimate
+			# Confidence falls as the predicted position gets less certain than a detection
+			deviation = np.sqrt((covariance[0, 0] + covariance[1, 1]) / 2)
+			return Sphero_Detection(state[0], state[1], self.last_detection.radius,
+				min(1.0, ESTIMATOR_MEASUREMENT / deviation), DETECTION_PREDICTED, frame.capture_time)
+		last = self.last_detection
+		return Sphero_Detection(last.x, last.y, last.radius, 0.0, DETECTION_STALE, last.capture_time)
+
+	# Returns the (red, green, blue) colour the Sphero LED must be set to for the detector
+	def spheroLEDColor(self):
+		if self.detector == 'led':
+			return LED_COLOR
+		return (0, 0, 0)
+
+	# Looks for the Sphero in a frame; returns a fresh Sphero_Detection, or None if it was not found.  A frame already
+	# searched gives the same answer again, and an older frame is not searched (it would move the trackers back)
+	def __detect(self, frame):
+		frame.foreground()	#Every frame goes into the camera's background model, even when the foreground is not needed
+		with self.__lock:
+			seq, detection = self.__detection_seq
+			if frame.seq <= seq:
+				frame.mark('detected')
+				return detection if frame.seq == seq else None
+			circles = self.tracker.find(frame)
+			detection = None
+			if circles is not None and len(circles[0]) == 1 and circles[0][0][0] != 0:
+				if self.detector == 'led':
+					(x, y, radius), confidence = circles[0][0], self.tracker.confidence	#No outline to fit to
+				else:
+					(x, y, radius), confidence = refine_circle(frame.gray(), circles[0][0])
+				detection = Sphero_Detection(x, y, radius, confidence, DETECTION_FRESH, frame.capture_time)
+				self.estimator.update(x, y, frame.capture_time, confidence)
+				self.odometry.add_camera_fix(x, y, frame.capture_time)
+				self.last_detection = detection
+			self.__detection_seq = (frame.seq, detection)
+		frame.mark('detected')
+		return detection
+
+	# Returns the estimated Sphero state [x, y, vx, vy] (pixels, pixels per second) and its covariance at time t
+	# (default now), or None if the Sphero has not been seen recently
+	def getSpheroEstimate(self, t = None):
+		if t is None:
+			t = time.time()
+		return self.estimator.estimate(t)
+
+	# Adds a Sphero to be tracked by getSpheroPositions; color is the (red, green, blue) its LED is set to, None if unlit
+	def addSphero(self, name, color = None):
+		self.multi_tracker.add_sphero(name, color)
+
+	# Returns a dictionary of the Sphero circles (x, y, radius) found in a frame by name, for all the Spheros added
+	# with addSphero.  One circle search is shared by all of them.
+	def getSpheroPositions(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		return frame.product('sphero_positions', lambda: self.__find_spheros(frame))
+
+	def __find_spheros(self, frame):
+		with self.__lock:
+			seq, positions = self.__positions_seq
+			if frame.seq > seq:	#A frame already searched (or an older one) gives the newest positions
+				positions = self.multi_tracker.find(frame)
+				self.__positions_seq = (frame.seq, positions)
+			return positions
+
+	# Returns a list of the maze cells (row, col) where something other than the Sphero differs from the camera's model
+	# of the empty board, such as a wall being moved.  Empty until the camera has a background model.
+	def getMovingCells(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		foreground = frame.foreground()
+		if foreground is None:
+			return []
+		detection = self.getSpheroDetection(frame)
+		if detection.source != DETECTION_STALE:
+			foreground = foreground.copy()
+			cv2.circle(foreground, (int(round(detection.x)), int(round(detection.y))),
+				int(detection.radius * MOVING_SPHERO_MARGIN) + 1, 0, -1)
+		# Fraction of each cell that is foreground (the image is a whole number of pixels per cell)
+		cells = cv2.resize(foreground, (self.geometry.cols, self.geometry.rows), interpolation = cv2.INTER_AREA) / 255.0
+		return [(int(r), int(c)) for r, c in zip(*np.nonzero(cells > MOVING_CELL_FRACTION))]
+
+	def getStartPoint(self, frame = None):
+		c = self.getSpheroCorodinates(frame)
+		return self.geometry.matrix_index(*self.geometry.cell_at(c[0], c[1]))
+
+	# Returns the endpoint (x, y), or None if it has never been found.  A frame where the endpoint cannot be seen (the
+	# Sphero is on it) gives the position it was last found at.
+	def findEndMarker(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		return frame.product('endpoint_position', lambda: self.__find_endpoint(frame))
+
+	def __find_endpoint(self, frame):
+		with self.__lock:
+			if frame.seq > self.__endpoint_seq:	#A frame already looked at (or an older one) gives the kept position
+				self.__endpoint_seq = frame.seq
+				return self.endpoint.find(frame)
+			return self.endpoint.position
+
+	def getEndPoint(self, frame = None):
+		c = self.findEndMarker(frame)
+		if c is None:
+			raise Exception('No Endpoint found')
+		return self.geometry.matrix_index(*self.geometry.cell_at(c[0], c[1]))
+
+
+	# Returns the wall scores of a frame: (horizontal, vertical), the number of wall pixels (times 255) in the rectangle
+	# over each edge between neighbouring cells.  horizontal[r, c] is between cells (r, c) and (r, c + 1), vertical[r, c]
+	# between (r, c) and (r + 1, c).  Every rectangle is summed at once from one integral image.
+	def scoreWalls(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		return frame.product('wall_scores', lambda: self.__rectangle_sums(frame.walls()))
+
+	# Returns the parts of the wall rectangles covered by the Sphero or by a large foreground blob (such as a hand) in a
+	# frame as (hidden, visible): the wall scores of the covered pixels and the fraction of each rectangle that can
+	# still be seen, each (horizontal, vertical) as in scoreWalls.  None if nothing covers the board.
+	def occludedEdges(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		return frame.product('occluded_edges', lambda: self.__occluded_edges(frame))
+
+	def __occluded_edges(self, frame):
+		covered = None
+		blobs = frame.foreground_blobs() or []
+		min_area = OCCLUSION_MIN_CELLS * self.geometry.cell_width * self.geometry.cell_height
+		for x, y, w, h in blobs:
+			if w * h < min_area:
+				break	#Largest first, the rest are smaller (walls being moved, the Sphero)
+			if covered is None:
+				covered = np.zeros((self.geometry.height, self.geometry.width), np.uint8)
+			covered[y:y + h, x:x + w] = 255
+		detection = self.getSpheroDetection(frame)
+		if detection.source != DETECTION_STALE:
+			if covered is None:
+				covered = np.zeros((self.geometry.height, self.geometry.width), np.uint8)
+			cv2.circle(covered, (int(round(detection.x)), int(round(detection.y))),
+				int(detection.radius * MOVING_SPHERO_MARGIN) + 1, 255, -1)
+		if covered is None:
+			return
+		hidden = self.__rectangle_sums(cv2.bitwise_and(frame.walls(), covered))
+		covered_sums = self.__rectangle_sums(covered)
+		visible = [1 - sums / (255.0 * area) for sums, area in zip(covered_sums, self.__rectangle_areas)]
+		return hidden, visible
+
+	# Returns the sums of an image over the wall rectangles (horizontal, vertical), from one integral image
+	def __rectangle_sums(self, image):
+		integral = cv2.integral(image, sdepth = cv2.CV_64F)	#32 bit sums of a 0/255 image overflow past 8.4 MP
+		scores = []
+		for top, bottom, left, right in self.__edge_rectangles:
+			scores.append(integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left])
+		return scores[0], scores[1]
+
+	# Returns the (top, bottom, left, right) index arrays of the rectangles checked for walls, for the horizontal and
+	# then the vertical edges (see scoreWalls)
+	def __wall_rectangles(self):
+		colW = self.geometry.cell_width
+		rowH = self.geometry.cell_height
+		x_curr = (colW / 2 + np.arange(self.geometry.cols) * colW).astype(int)[np.newaxis, :]	#Cell centres
+		y_curr = (rowH / 2 + np.arange(self.geometry.rows) * rowH).astype(int)[:, np.newaxis]
+		x_next = x_curr + colW
+		y_next = y_curr + rowH
+		#Rectangle between a cell and the next one to the right, and the next one down
+		horizontal = (y_curr - rowH//4, y_curr + rowH//4, x_curr[:, :-1] + colW//4, x_next[:, :-1] - colW//4)
+		vertical = (y_curr[:-1] + rowH//4, y_next[:-1] - rowH//4, x_curr - colW//4, x_curr + colW//4)
+		return [tuple(np.broadcast_arrays(*horizontal)), tuple(np.broadcast_arrays(*vertical))]
+
+	def findMazeMatrix(self, frame = None):
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		with self.__lock:
+			if frame.seq <= self.__edges_seq:
+				return self.maze	#Already added (or older than the newest frame added)
+			self.__edges_seq = frame.seq
+			return self.__find_maze_matrix(frame)
+
+	def __find_maze_matrix(self, frame):
+		sphero_coordinates = self.getSpheroCorodinates(frame)
+		horizontal, vertical = self.scoreWalls(frame)
+		thresholds = self.__wall_thresholds
+		frozen = None
+		occlusion = self.occludedEdges(frame)
+		if occlusion is not None:
+			#Only the wall pixels that can be seen are scored, against a threshold for the part that can be seen
+			hidden, visible = occlusion
+			horizontal, vertical = horizontal - hidden[0], vertical - hidden[1]
+			thresholds = [threshold * fraction for threshold, fraction in zip(thresholds, visible)]
+			frozen = tuple(fraction < OCCLUSION_MIN_VISIBLE for fraction in visible)
+
+		#smaller dots should be less than FILTER_THRESHOLD and walls should be bigger
+		seen = (horizontal < thresholds[0],	#no wall between a cell and the next one right
+			vertical < thresholds[1])	#no wall between a cell and the next one down
+
+		self.__wall_debug_frame = (frame, seen)	#The debug image is only drawn if wall_img_debug is asked for
+		self.__update_edges(seen, frozen)
 		if(False): #debug stuff
 			print('This is the maze:')
-			print(maze)
+			print(self.maze)
 			#cv2.imshow('Maze', self.wall_img_debug)
 			#cv2.waitKey(5000)
-		self.previous_mazes.append(maze)
-		return np.median(self.previous_mazes, axis = 0)
+		return self.maze
+
+	# Adds the edges seen in a frame to each edge's confidence.  An edge only flips once its confidence passes the
+	# threshold on the far side (hysteresis), so a wall flickering for one frame is ignored.  Frozen edges (None for
+	# none), too hidden to be seen properly, keep their confidence.
+	def __update_edges(self, seen, frozen = None):
+		if self.edge_confidence is None:
+			self.edge_confidence = tuple(edges.astype(np.float32) for edges in seen)	#First frame, taken as it is
+			self.__edge_open = tuple(edges.copy() for edges in seen)
+			self.__publish_maze([])
+			return
+		changed = []
+		for i in range(2):
+			confidence, is_open = self.edge_confidence[i], self.__edge_open[i]
+			change = EDGE_RATE * (seen[i] - confidence)
+			if frozen is not None:
+				change[frozen[i]] = 0
+			confidence += change
+			flips = np.where(is_open, confidence < EDGE_CLOSE, confidence > EDGE_OPEN)
+			if flips.any():
+				is_open ^= flips
+				#Maze matrix index of horizontal edge (r, c) is [2r + 1, 2c + 2], of vertical edge [2r + 2, 2c + 1]
+				changed += [[2 * r + 1 + i, 2 * c + 2 - i] for r, c in np.argwhere(flips).tolist()]
+		if changed:
+			self.__publish_maze(changed)
+
+	# Publishes the open edges as a new maze version
+	def __publish_maze(self, changed):
+		self.maze = self.__maze_matrix(*self.__edge_open)
+		self.maze_version += 1
+		self.changed_edges = changed
+
+	# Returns the maze matrix with the given horizontal and vertical edges open
+	def __maze_matrix(self, horizontal, vertical):
+		maze = np.zeros(self.geometry.matrix_shape())
+		maze[1:-1:2, 1:-1:2] = 1
+		maze[1:-1:2, 2:-2:2] = horizontal
+		maze[2:-2:2, 1:-1:2] = vertical
+		return maze
+
+	# Wall image of the last frame findMazeMatrix was run on, with the valid Sphero paths drawn on it (None before the
+	# first findMazeMatrix)
+	@property
+	def wall_img_debug(self):
+		if self.__wall_debug_frame is None:
+			return
+		frame, seen = self.__wall_debug_frame
+		return frame.product('wall_img_debug', lambda: self.__draw_wall_debug(frame.walls(), self.__maze_matrix(*seen)))
+
+	def __draw_wall_debug(self, walls_img, maze):
+		wall_img_debug = walls_img.copy()
+		colW = self.geometry.cell_width
+		rowH = self.geometry.cell_height
+		for r in range(self.geometry.rows):
+			for c in range(self.geometry.cols):
+				x_curr = int(colW / 2 + c * colW)
+				y_curr = int(rowH / 2 + r * rowH)
+				if c != self.geometry.cols - 1 and maze[r * 2 + 1, c * 2 + 2]:
+					cv2.line(wall_img_debug, (x_curr, y_curr), (x_curr + colW, y_curr), 200)	#draws valid sphero paths
+				if r != self.geometry.rows - 1 and maze[r * 2 + 2, c * 2 + 1]:
+					cv2.line(wall_img_debug, (x_curr, y_curr), (x_curr, y_curr + rowH), 200)
+		return wall_img_debug
 
+	# Returns the node (see maze_geometry.py) of a maze image point
 	def coord_to_dik_num(self, c):
-		array_pos = [2*int(c[1]*ROWS/PERSPECTIVE_HEIGHT)+1, 2*int(c[0]*COLS/PERSPECTIVE_WIDTH)+1]
-		return (array_pos[0] - 1) * 5 + (array_pos[1] - 1) / 2
-
-	def solveMaze(self):
+		return self.geometry.node_at(c[0], c[1])
+
+	# Converts the 2 dimentional maze array to a dictionary of dictionaries to form a weighted graph for dijkstra to use.
+	# An edge costs 1, plus up to EDGE_UNCERTAIN_COST the less confident it is that the edge is open.
+	def __maze_graph(self, maze):
+		cols = self.geometry.cols
+		horizontal, vertical = [1 + EDGE_UNCERTAIN_COST * (1 - c.astype(float)) for c in self.edge_confidence]
+		edges = defaultdict(dict)
+		for node in range(self.geometry.nodes):
+			row, col = self.geometry.cell(node)
+			if(col > 0):
+				if (maze[row * 2 + 1][col * 2]): #there is no wall between node and node - 1 (the cell to the left)
+					edges[node][node - 1] = edges[node - 1][node] = horizontal[row, col - 1]
+			if(row > 0):
+				if (maze[row * 2][col * 2 + 1]): #there is no wall between node and node - cols (the cell above)
+					edges[node][node - cols] = edges[node - cols][node] = vertical[row - 1, col]
+		return edges
+
+	def solveMaze(self, frame = None):
 		'''
-		This code processes information for dijkstras formula then calls it to find the fastest path
+		This code processes information for dijkstras formula then calls it to find the fastest path.
+		All of the detections are made from one captured frame so they agree in time.
+		Dijkstra is only run again when the maze version (a wall moved) or the end cell changes; until then the
+		path from the Sphero's cell is read from the shortest path tree kept from last time.
 		'''
-		maze = self.findMazeMatrix()
-		start_pt = self.getStartPoint()
-		end_pt = self.getEndPoint()
-		start = (start_pt[0] - 1) * 5 + (start_pt[1] - 1) / 2
-		end = (end_pt[0] - 1) * 5 + (end_pt[1] - 1) / 2
-
-		#positions = set([0,1,2,3,4,5,6,10,11,12,13,14,15,16,20,21,22,23,24,25,26,30,31,32,33,34,35,36])
-		positions = set() #following code populates the set automatically based on the rows and columns
-		for row in range(0, ROWS):
-			for col in range(0, COLS):
-				positions.add(10 * row + col) # 10's position is rows 1's position is columns
-
-		edges = defaultdict(dict) 					# Converts the 2 dimentional maze array to a dictionary of dictionaries
-		for node in positions:						# to form a weighted graph for dijkstra to use
-			if(node % 10 > 0):						# 10s position is rows 1s position is columns
-				if (maze[(node // 10) * 2 + 1][(node % 10) * 2]): #there is no wall between node and node - 1
-					edges[node][node - 1] = 1
-					edges[node - 1][node] = 1
-			if(node // 10 > 0):
-				if (maze[(node // 10) * 2][(node % 10) * 2 + 1]): #there is no wall between node and node - 10
-					edges[node][node - 10] = 1
-					edges[node - 10][node] = 1
-
-		try:
-			checkpoints = dijkstra.shortestPath(edges, start, end)
-		except:
+		if frame is None:
+			frame = self.camera.get_frame_context()
+		with self.__lock:
+			return self.__solve_maze(frame)
+
+	def __solve_maze(self, frame):
+		maze = self.findMazeMatrix(frame)
+		start_pt = self.getStartPoint(frame)
+		end_pt = self.getEndPoint(frame)
+		start = self.geometry.node((start_pt[0] - 1) // 2, (start_pt[1] - 1) // 2)
+		end = self.geometry.node((end_pt[0] - 1) // 2, (end_pt[1] - 1) // 2)
+
+		if self.__route is not None and self.__route[:3] == (self.maze_version, start, end):
+			frame.mark('planned')
+			return list(self.__route[3])	#Same maze, same cells: same checkpoints
+
+		if self.__plan is None or self.__plan[:2] != (self.maze_version, end):
+			#Shortest paths from every cell to the end, kept until a wall moves or the end is moved
+			distances, predecessors = dijkstra.Dijkstra(self.__maze_graph(maze), end)
+			self.__plan = (self.maze_version, end, predecessors)
+		predecessors = self.__plan[2]
+		if start != end and start not in predecessors:
 			raise Exception('Dikstra Failed')
+		checkpoints = [start]
+		while checkpoints[-1] != end:
+			checkpoints.append(predecessors[checkpoints[-1]])
 
 		#Now I pull out the checkpoints that are not corners
 		del checkpoints[0]
 		i = len(checkpoints) - 2
 		while i > 0:
-			if checkpoints[i] % 10 == checkpoints[i + 1] % 10 and checkpoints[i] % 10 == checkpoints[i - 1] % 10:
+			before, here, after = [self.geometry.cell(n) for n in checkpoints[i - 1:i + 2]]
+			if here[1] == after[1] and here[1] == before[1]:	#same column
 				del checkpoints[i]
-			elif checkpoints[i] // 10 == checkpoints[i + 1] // 10 and checkpoints[i] // 10 == checkpoints[i - 1] // 10:
+			elif here[0] == after[0] and here[0] == before[0]:	#same row
 				del checkpoints[i]
 			i = i - 1
 
+		self.__route = (self.maze_version, start, end, list(checkpoints))
+		frame.mark('planned')
 		return checkpoints
 
 
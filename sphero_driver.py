@@ -61,18 +61,19 @@ MRSP = dict(
 
 
 #ID codes for asynchronous packets
+#(Python 3: received packets are bytes, so the codes are ints)
 IDCODE = dict(
-  PWR_NOTIFY = chr(0x01),               #Power notifications
-  LEVEL1_DIAG = chr(0x02),              #Level 1 Diagnostic response
-  DATA_STRM = chr(0x03),                #Sensor data streaming
-  CONFIG_BLOCK = chr(0x04),             #Config block contents
-  SLEEP = chr(0x05),                    #Pre-sleep warning (10 sec)
-  MACRO_MARKERS =chr(0x06),             #Macro markers
-  COLLISION = chr(0x07))                #Collision detected
+  PWR_NOTIFY = 0x01,                    #Power notifications
+  LEVEL1_DIAG = 0x02,                   #Level 1 Diagnostic response
+  DATA_STRM = 0x03,                     #Sensor data streaming
+  CONFIG_BLOCK = 0x04,                  #Config block contents
+  SLEEP = 0x05,                         #Pre-sleep warning (10 sec)
+  MACRO_MARKERS = 0x06,                 #Macro markers
+  COLLISION = 0x07)                     #Collision detected
 
 RECV = dict(
-  ASYNC = [chr(0xff), chr(0xfe)],
-  SYNC = [chr(0xff), chr(0xff)])
+  ASYNC = b'\xff\xfe',
+  SYNC = b'\xff\xff')
 
 
 REQ = dict(
@@ -236,7 +237,7 @@ class Sphero(threading.Thread):
     self.stream_mask1 = None
     self.stream_mask2 = None
     self.seq = 0
-    self.raw_data_buf = []
+    self.raw_data_buf = b''
     self._communication_lock = threading.Lock()
     self._async_callback_dict = dict()
     self._sync_callback_dict = dict()
@@ -258,15 +259,15 @@ class Sphero(threading.Thread):
     return req + [self.seq] + [len(cmd)+1] + cmd
 
   def data2hexstr(self, data):
-    return ' '.join([ ("%02x"%ord(d)) for d in data])
+    return ' '.join([ ("%02x"%d) for d in data])
 
   def create_mask_list(self, mask1, mask2):
     #save the mask
-    sorted_STRM1 = sorted(STRM_MASK1.iteritems(), key=operator.itemgetter(1), reverse=True)
+    sorted_STRM1 = sorted(STRM_MASK1.items(), key=operator.itemgetter(1), reverse=True)
     #create a list containing the keys that are part of the mask
     self.mask_list1 = [key  for key, value in sorted_STRM1 if value & mask1]
 
-    sorted_STRM2 = sorted(STRM_MASK2.iteritems(), key=operator.itemgetter(1), reverse=True)
+    sorted_STRM2 = sorted(STRM_MASK2.items(), key=operator.itemgetter(1), reverse=True)
     #create a list containing the keys that are part of the mask
     self.mask_list2 = [key  for key, value in sorted_STRM2 if value & mask2]
     self.mask_list = self.mask_list1 + self.mask_list2
@@ -570,10 +571,10 @@ class Sphero(threading.Thread):
     """
     mask1 = 0
     mask2 = 0
-    for key,value in STRM_MASK1.iteritems():
+    for key,value in STRM_MASK1.items():
       if 'FILTERED' in key:
         mask1 = mask1|value
-    for value in STRM_MASK2.itervalues():
+    for value in STRM_MASK2.values():
         mask2 = mask2|value
     self.set_data_strm(sample_div, sample_frames, mask1, pcnt, mask2, response)
 
@@ -589,10 +590,10 @@ class Sphero(threading.Thread):
     """
     mask1 = 0
     mask2 = 0
-    for key,value in STRM_MASK1.iteritems():
+    for key,value in STRM_MASK1.items():
       if 'RAW' in key:
         mask1 = mask1|value
-    for value in STRM_MASK2.itervalues():
+    for value in STRM_MASK2.values():
         mask2 = mask2|value
     self.set_data_strm(sample_div, sample_frames, mask1, pcnt, mask2, response)
 
@@ -609,9 +610,9 @@ class Sphero(threading.Thread):
     """
     mask1 = 0
     mask2 = 0
-    for value in STRM_MASK1.itervalues():
+    for value in STRM_MASK1.values():
         mask1 = mask1|value
-    for value in STRM_MASK2.itervalues():
+    for value in STRM_MASK2.values():
         mask2 = mask2|value
     self.set_data_strm(sample_div, sample_frames, mask1, pcnt, mask2, response)
 
@@ -809,14 +810,14 @@ class Sphero(threading.Thread):
     '''
 
     while self.is_connected and not self.shutdown:
-      with self._communication_lock:
-        self.raw_data_buf += self.bt.recv(num_bytes)
+      # Not under the communication lock: recv blocks until data arrives, and commands must still be sent meanwhile
+      self.raw_data_buf += self.bt.recv(num_bytes)
       data = self.raw_data_buf
       while len(data)>5:
         if data[:2] == RECV['SYNC']:
           #print "got response packet"
           # response packet
-          data_length = ord(data[4])
+          data_length = data[4]
           if data_length+5 <= len(data):
             data_packet = data[:(5+data_length)]
             data = data[(5+data_length):]
@@ -825,18 +826,18 @@ class Sphero(threading.Thread):
             #print "Response packet", self.data2hexstr(data_packet)
 
         elif data[:2] == RECV['ASYNC']:
-          data_length = (ord(data[3])<<8)+ord(data[4])
+          data_length = (data[3]<<8)+data[4]
           if data_length+5 <= len(data):
             data_packet = data[:(5+data_length)]
             data = data[(5+data_length):]
           else:
             # the remainder of the packet isn't long enough
             break
-          if data_packet[2]==IDCODE['DATA_STRM'] and self._async_callback_dict.has_key(IDCODE['DATA_STRM']):
+          if data_packet[2]==IDCODE['DATA_STRM'] and IDCODE['DATA_STRM'] in self._async_callback_dict:
             self._async_callback_dict[IDCODE['DATA_STRM']](self.parse_data_strm(data_packet, data_length))
-          elif data_packet[2]==IDCODE['COLLISION'] and self._async_callback_dict.has_key(IDCODE['COLLISION']):
+          elif data_packet[2]==IDCODE['COLLISION'] and IDCODE['COLLISION'] in self._async_callback_dict:
             self._async_callback_dict[IDCODE['COLLISION']](self.parse_collision_detect(data_packet, data_length))
-          elif data_packet[2]==IDCODE['PWR_NOTIFY'] and self._async_callback_dict.has_key(IDCODE['PWR_NOTIFY']):
+          elif data_packet[2]==IDCODE['PWR_NOTIFY'] and IDCODE['PWR_NOTIFY'] in self._async_callback_dict:
             self._async_callback_dict[IDCODE['PWR_NOTIFY']](self.parse_pwr_notify(data_packet, data_length))
           else:
             print ("got a packet that isn't streaming: " + self.data2hexstr(data))
@@ -859,7 +860,7 @@ class Sphero(threading.Thread):
       * 03h = Battery Low,
       * 04h = Battery Critical
     '''
-    return struct.unpack_from('B', ''.join(data[5:]))[0]
+    return struct.unpack_from('B', data, 5)[0]
 
   def parse_collision_detect(self, data, data_length):
     '''
@@ -888,13 +889,13 @@ class Sphero(threading.Thread):
     '''
     output={}
 
-    output['X'], output['Y'], output['Z'], output['Axis'], output['xMagnitude'], output['yMagnitude'], output['Speed'], output['Timestamp'] = struct.unpack_from('>hhhbhhbI', ''.join(data[5:]))
+    output['X'], output['Y'], output['Z'], output['Axis'], output['xMagnitude'], output['yMagnitude'], output['Speed'], output['Timestamp'] = struct.unpack_from('>hhhbhhbI', data, 5)
     return output
 
   def parse_data_strm(self, data, data_length):
     output={}
-    for i in range((data_length-1)/2):
-      unpack = struct.unpack_from('>h', ''.join(data[5+2*i:]))
+    for i in range((data_length-1)//2):
+      unpack = struct.unpack_from('>h', data, 5+2*i)
       output[self.mask_list[i]] = unpack[0]
     #print self.mask_list
     #print output
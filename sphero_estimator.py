@@ -0,0 +1,184 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Sphero Estimator
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Kalman filter for the Sphero position and velocity
+# 2.  Velocity measurements from the Sphero odometry
+
+import threading
+import collections
+import numpy as np
+
+ESTIMATOR_ACCELERATION = 400.0  # Standard deviation of the Sphero acceleration (pixels per second squared)
+ESTIMATOR_MEASUREMENT = 2.0  # Standard deviation of a detected Sphero position (pixels)
+ESTIMATOR_INITIAL_VELOCITY = 200.0  # Standard deviation of the velocity when the Sphero is first seen (pixels per second)
+ESTIMATOR_MAX_AGE = 0.5  # Seconds the estimate is used for after the last detection
+ESTIMATOR_GATE = 13.8  # Detections further than this (squared Mahalanobis distance, 99.9%) from the estimate are outliers
+ESTIMATOR_MAX_OUTLIERS = 3  # Outliers in a row that restart the filter (the Sphero was picked up or bumped)
+ESTIMATOR_MAX_ODOMETRY_AGE = 2.0  # Seconds the estimate is used for without a detection, if odometry keeps coming
+ESTIMATOR_ODOMETRY_GAP = 0.2  # Odometry older than this (seconds) no longer keeps the estimate going
+ESTIMATOR_HISTORY = 0.3  # Seconds of measurements kept, so a late frame can be slotted in among them
+ESTIMATOR_MIN_CONFIDENCE = 0.25  # Detection confidences are raised to this (a confidence of 0.25 is 4 times as noisy)
+
+#####################################################################
+# The purpose of this code is to keep one consistent estimate of
+# where the Sphero is and how fast it is moving.  Detections come in
+# with the capture time of their frame; between them the Sphero is
+# assumed to keep its velocity, so the estimate can be asked for at
+# any time (for example the moment a roll command is sent) and a
+# missed frame only makes the estimate less certain.  State is
+# [x, y, vx, vy] in maze image pixels.
+#
+# Velocities measured by the Sphero itself (odometry, see
+# sphero_odometry.py) can be added between camera frames.  They keep
+# the predicted position on track while the camera cannot see the
+# Sphero, so the estimate is kept for longer as long as they arrive.
+#####################################################################
+
+class Sphero_Estimator():
+    def __init__(self):
+        self.state = None  # [x, y, vx, vy], None until the Sphero is first seen
+        self.covariance = None  # 4x4 state covariance
+        self.time = 0  # Time (capture time) the state is for
+        self.last_detection = 0  # Capture time of the last detection used
+        self.outliers = 0  # Detections rejected in a row
+        self.last_odometry = 0  # Time of the last odometry velocity used
+        self.history = collections.deque()  # Recent measurements (time, kind, values, filter after it), oldest first
+        self.lock = threading.Lock()  # Detections and queries can come from different threads
+        self.__measurement = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], np.float64)  # Position is measured
+        self.__velocity_measurement = np.array([[0, 0, 1, 0], [0, 0, 0, 1]], np.float64)  # Odometry measures velocity
+
+    # Returns the (state, covariance) moved forward from the current state to time t
+    def __predict(self, t):
+        dt = max(0.0, t - self.time)
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = dt
+        # Random acceleration between updates (discrete white noise acceleration model)
+        q = np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]]) * ESTIMATOR_ACCELERATION ** 2
+        noise = np.zeros((4, 4))
+        noise[np.ix_([0, 2], [0, 2])] = q
+        noise[np.ix_([1, 3], [1, 3])] = q
+        return transition.dot(self.state), transition.dot(self.covariance).dot(transition.T) + noise
+
+    # Adds a detected Sphero position (x, y) from a frame captured at time t.  A detection with a lower confidence (0 to
+    # 1) is counted as noisier.  Returns false if the detection was rejected as an outlier.
+    def update(self, x, y, t, confidence=1.0):
+        deviation = ESTIMATOR_MEASUREMENT / max(confidence, ESTIMATOR_MIN_CONFIDENCE)
+        with self.lock:
+            return self.__add('position', (x, y, deviation), t)
+
+    # Adds a velocity (vx, vy in pixels per second) measured by the Sphero odometry at time t, with a standard
+    # deviation of noise pixels per second.  Ignored until the Sphero has been detected by the camera.
+    def update_velocity(self, vx, vy, t, noise):
+        with self.lock:
+            if self.is_tracking(t):
+                self.__add('velocity', (vx, vy, noise), t)
+
+    # Adds a measurement in time order.  A frame is stamped with its capture time but only arrives once it has been
+    # processed, after odometry received in the meantime; so a measurement older than the estimate is slotted into
+    # the history and the measurements after it are applied again.
+    def __add(self, kind, values, t):
+        if self.state is None or t >= self.time:
+            accepted = self.__apply(kind, values, t)
+            self.__remember(kind, values, t)
+            return accepted
+        if len(self.history) == 0 or t < self.history[0][0]:
+            return True  # Too old to slot in, nothing to add
+
+        # Go back to the state after the last measurement older than this one, then apply the rest again
+        index = len(self.history)
+        while self.history[index - 1][0] > t:
+            index -= 1
+        later = list(self.history)[index:]
+        for i in range(len(self.history) - index):
+            self.history.pop()
+        self.state, self.covariance, self.time, self.last_detection, self.last_odometry, self.outliers = \
+            self.history[-1][3]
+        accepted = self.__apply(kind, values, t)
+        self.__remember(kind, values, t)
+        for entry in later:
+            self.__apply(entry[1], entry[2], entry[0])
+            self.__remember(entry[1], entry[2], entry[0])
+        return accepted
+
+    # Keeps a measurement and the filter after it, for ESTIMATOR_HISTORY seconds
+    def __remember(self, kind, values, t):
+        self.history.append((t, kind, values, (self.state, self.covariance, self.time, self.last_detection,
+                                              self.last_odometry, self.outliers)))
+        while self.history and self.history[0][0] < self.time - ESTIMATOR_HISTORY:
+            self.history.popleft()
+
+    # Applies one measurement at time t (not before the current state)
+    def __apply(self, kind, values, t):
+        x, y, deviation = values
+        if kind == 'position':
+            if not self.is_tracking(t):
+                self.__start(x, y, t, deviation)
+                return True
+            measurement = self.__measurement
+        else:
+            measurement = self.__velocity_measurement
+        noise = np.eye(2) * deviation ** 2
+
+        state, covariance = self.__predict(t)
+        residual = np.array([x, y]) - measurement.dot(state)
+        inverse = np.linalg.inv(measurement.dot(covariance).dot(measurement.T) + noise)
+        if kind == 'position' and residual.dot(inverse).dot(residual) > ESTIMATOR_GATE:
+            self.outliers += 1
+            if self.outliers >= ESTIMATOR_MAX_OUTLIERS:
+                self.__start(x, y, t, deviation)  # The Sphero really is somewhere else now
+                return True
+            return False
+
+        gain = covariance.dot(measurement.T).dot(inverse)
+        self.state = state + gain.dot(residual)
+        self.covariance = (np.eye(4) - gain.dot(measurement)).dot(covariance)
+        self.time = t
+        if kind == 'position':
+            self.last_detection = t
+            self.outliers = 0
+        else:
+            self.last_odometry = t
+        return True
+
+    # Restarts the filter at a detected position (with a standard deviation of deviation pixels), not moving
+    def __start(self, x, y, t, deviation):
+        self.state = np.array([x, y, 0.0, 0.0])
+        self.covariance = np.diag([deviation ** 2, deviation ** 2,
+                                   ESTIMATOR_INITIAL_VELOCITY ** 2, ESTIMATOR_INITIAL_VELOCITY ** 2])
+        self.time = t
+        self.last_detection = t
+        self.outliers = 0
+
+    # Returns (state [x, y, vx, vy], covariance) predicted to time t, or None if the Sphero has not been seen in the
+    # last ESTIMATOR_MAX_AGE seconds
+    def estimate(self, t):
+        with self.lock:
+            if not self.is_tracking(t):
+                return
+            return self.__predict(t)
+
+    # Returns true if the Sphero was detected recently enough for the estimate to be used at time t.  With odometry
+    # still arriving, a detection up to ESTIMATOR_MAX_ODOMETRY_AGE seconds old is recent enough.
+    def is_tracking(self, t):
+        if self.state is None:
+            return False
+        if t - self.last_detection <= ESTIMATOR_MAX_AGE:
+            return True
+        return t - self.last_detection <= ESTIMATOR_MAX_ODOMETRY_AGE and \
+            t - self.last_odometry <= ESTIMATOR_ODOMETRY_GAP
+
+    # Forgets the Sphero
+    def reset(self):
+        with self.lock:
+            self.state = None
+            self.covariance = None
+            self.history.clear()
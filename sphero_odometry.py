@@ -0,0 +1,192 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Sphero Odometry
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Streams the Sphero locator and velocity and adds them to the Sphero estimate
+
+import time
+import threading
+import collections
+import numpy as np
+
+# Data streaming (see STRM_MASK1, STRM_MASK2 and IDCODE in sphero_driver.py; the values are repeated here so this file
+# does not need the Bluetooth module)
+ODOMETRY_MASK1 = 0x00010000  # IMU_YAW_FILTERED
+ODOMETRY_MASK2 = 0x08000000 | 0x04000000 | 0x01000000 | 0x00800000  # ODOM_X, ODOM_Y, VELOCITY_X, VELOCITY_Y
+DATA_STRM = 0x03  # Async packet ID of streamed data
+ODOMETRY_SAMPLE_DIV = 8  # The Sphero samples at 400 Hz divided by this (50 Hz)
+
+ODOMETRY_BUFFER = 500  # Samples kept (10 seconds at 50 Hz)
+ODOMETRY_LATENCY = 0.03  # Seconds between the Sphero taking a sample and it arriving
+ODOMETRY_VELOCITY_NOISE = 15.0  # Standard deviation of a streamed velocity after conversion (pixels per second)
+ODOMETRY_FIT_PAIRS = 100  # Camera / odometry movements kept for fitting the odometry to image conversion
+ODOMETRY_MIN_PAIRS = 20  # Movements needed before the odometry is used
+ODOMETRY_MIN_MOVE = 15.0  # Smallest camera movement (pixels) used for fitting; smaller ones are mostly detection noise
+ODOMETRY_MAX_MOVE_TIME = 0.5  # Longest time (seconds) a movement is measured over
+ODOMETRY_MAX_ERROR = 0.25  # Largest RMS error of a trusted fit, as a fraction of the RMS camera movement
+
+#####################################################################
+# The purpose of this code is to use what the Sphero knows about its
+# own movement.  The Sphero streams its locator position (cm) and
+# velocity (mm/s) at ODOMETRY_SAMPLE_DIV; each sample is timestamped
+# and kept in a ring buffer.
+#
+# The locator axes depend on how the Sphero was oriented, so the
+# conversion from odometry to maze image pixels (scale, rotation and
+# mirroring) is fitted from the camera: every pair of camera
+# detections gives a movement in pixels, and the locator gives the
+# same movement in cm.  Once the fit is good, each streamed velocity
+# is converted and added to the Sphero estimate, giving updates
+# between camera frames and keeping the estimate going while the
+# camera loses the Sphero.
+#####################################################################
+
+class Sphero_Odometry():
+    def __init__(self, estimator):
+        self.estimator = estimator  # Sphero_Estimator the velocities are added to
+        self.samples = collections.deque(maxlen=ODOMETRY_BUFFER)  # (time, x cm, y cm, vx mm/s, vy mm/s, yaw degrees)
+        self.pairs = collections.deque(maxlen=ODOMETRY_FIT_PAIRS)  # (odometry movement cm, camera movement pixels)
+        self.conversion = None  # 2x2 matrix from locator cm to image pixels, None until fitted
+        self.fit_error = None  # RMS error (pixels) of the last fit
+        self.used = 0  # Number of velocities added to the estimate
+        self.streaming = False
+        self.lock = threading.Lock()
+        self.__fixes = collections.deque(maxlen=ODOMETRY_FIT_PAIRS)  # Detections (time, x, y) waiting for odometry
+        self.__last_fix = None  # (time, x, y) of the last camera detection paired
+
+    # Starts streaming from a connected Sphero
+    def start(self, sphero, sample_div=ODOMETRY_SAMPLE_DIV):
+        if self.streaming:
+            return
+        sphero.add_async_callback(DATA_STRM, self.__on_data)
+        sphero.set_data_strm(sample_div, 1, ODOMETRY_MASK1, 0, ODOMETRY_MASK2, False)
+        if not sphero.is_alive():
+            sphero.daemon = True
+            sphero.start()  # The Sphero thread receives the streamed packets
+        self.streaming = True
+        print("Sphero Odometry: Streaming at", 400 // sample_div, "Hz")
+
+    # Stops streaming.  The conversion is forgotten, the Sphero may be oriented differently next time.
+    def stop(self, sphero):
+        if not self.streaming:
+            return
+        sphero.set_data_strm(sample_div=ODOMETRY_SAMPLE_DIV, sample_frames=1, sample_mask1=0, pcnt=0,
+                             sample_mask2=0, response=False)
+        sphero.remove_async_callback(DATA_STRM)
+        self.streaming = False
+        with self.lock:
+            self.conversion = None
+            self.pairs.clear()
+            self.samples.clear()
+            self.__fixes.clear()
+            self.__last_fix = None
+
+    # Streamed data callback (runs on the Sphero thread)
+    def __on_data(self, data):
+        t = time.time() - ODOMETRY_LATENCY
+        try:
+            sample = (t, data['ODOM_X'], data['ODOM_Y'], data['VELOCITY_X'], data['VELOCITY_Y'],
+                      data['IMU_YAW_FILTERED'])
+        except KeyError:
+            return  # Not the fields asked for
+        self.add_sample(sample)
+
+    # Adds a sample (time, x cm, y cm, vx mm/s, vy mm/s, yaw degrees) and, once the conversion is known, adds its
+    # velocity to the estimate
+    def add_sample(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            conversion = self.conversion
+        self.__pair_fixes()
+        if conversion is not None:
+            vx, vy = conversion.dot([sample[3] / 10.0, sample[4] / 10.0])  # mm/s to cm/s to pixels/s
+            self.estimator.update_velocity(vx, vy, sample[0], ODOMETRY_VELOCITY_NOISE)
+            self.used += 1
+
+    # Returns the locator position (x cm, y cm) at time t, interpolated between samples, or None if t is not covered
+    def position_at(self, t):
+        with self.lock:
+            samples = list(self.samples)
+        if len(samples) < 2 or t < samples[0][0] or t > samples[-1][0]:
+            return
+        times = [sample[0] for sample in samples]
+        return (float(np.interp(t, times, [sample[1] for sample in samples])),
+                float(np.interp(t, times, [sample[2] for sample in samples])))
+
+    # Adds a camera detection (x, y pixels at capture time t).  The movement since the last detection and the locator
+    # movement over the same time make a pair for fitting the conversion.  A detection can arrive before the odometry
+    # covering its capture time, so it waits until then.
+    def add_camera_fix(self, x, y, t):
+        if not self.streaming:
+            return
+        with self.lock:
+            self.__fixes.append((t, x, y))
+        self.__pair_fixes()
+
+    # Pairs the waiting camera detections covered by the odometry received so far
+    def __pair_fixes(self):
+        with self.lock:
+            if len(self.__fixes) == 0 or len(self.samples) < 2:
+                return
+            latest = self.samples[-1][0]
+        while True:
+            with self.lock:
+                if len(self.__fixes) == 0 or self.__fixes[0][0] > latest:
+                    return
+                fix = self.__fixes.popleft()
+            last = self.__last_fix
+            if last is not None and fix[0] <= last[0]:
+                continue  # Out of order
+            if last is None or fix[0] - last[0] > ODOMETRY_MAX_MOVE_TIME:
+                self.__last_fix = fix  # Start a new movement
+                continue
+            camera_move = (fix[1] - last[1], fix[2] - last[2])
+            if np.hypot(camera_move[0], camera_move[1]) < ODOMETRY_MIN_MOVE:
+                continue  # Not moved far enough yet
+            self.__last_fix = fix
+            start, end = self.position_at(last[0]), self.position_at(fix[0])
+            if start is None or end is None:
+                continue
+            with self.lock:
+                self.pairs.append(((end[0] - start[0], end[1] - start[1]), camera_move))
+                if len(self.pairs) >= ODOMETRY_MIN_PAIRS:
+                    self.__fit()
+
+    # Fits the conversion from locator movements to camera movements (least squares); only kept if it fits well
+    def __fit(self):
+        odometry = np.array([pair[0] for pair in self.pairs])
+        camera = np.array([pair[1] for pair in self.pairs])
+        solution, residuals, rank, singular = np.linalg.lstsq(odometry, camera, rcond=None)
+        if rank < 2:
+            return  # Moved in a straight line only, the conversion is not known yet
+        error = np.sqrt(np.mean(np.sum((odometry.dot(solution) - camera) ** 2, axis=1)))
+        self.fit_error = float(error)
+        if error <= ODOMETRY_MAX_ERROR * np.sqrt(np.mean(np.sum(camera ** 2, axis=1))):
+            if self.conversion is None:
+                print("Sphero Odometry: Odometry matched to the camera, RMS error", round(float(error), 2), "pixels")
+            self.conversion = solution.T
+        else:
+            self.conversion = None  # Slipping wheels or a bad orientation, do not trust the odometry
+
+    # Returns a dictionary of the samples received, movements paired, velocities used and the fit
+    def stats(self):
+        with self.lock:
+            return {'samples': len(self.samples), 'pairs': len(self.pairs), 'used': self.used,
+                    'matched': self.conversion is not None, 'fit_error': self.fit_error}
+
+    def print_report(self):
+        stats = self.stats()
+        if stats['fit_error'] is None:
+            print("Sphero Odometry: {} samples, not matched to the camera".format(stats['samples']))
+            return
+        print("Sphero Odometry: {} samples, {} movements, {} velocities used, {} (RMS error {:.2f} px)".format(
+            stats['samples'], stats['pairs'], stats['used'], "matched" if stats['matched'] else "not matched",
+            stats['fit_error']))
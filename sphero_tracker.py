@@ -0,0 +1,475 @@
+#####################################################################
+# Brigham Young University
+# Sphero Maze Runner
+# ECEn Department Demo
+# Sphero Tracker
+#
+#####################################################################
+
+# Written in Python 3
+# Version 0.1 (Prototype)
+# About this version
+# October 18, 2026
+# 1.  Searches for the Sphero near where it was last seen before searching the whole board
+# 2.  Finds the Sphero by the colour of its LED
+# 3.  Tracks several Spheros at once, told apart by LED colour and movement
+# 4.  Detection results with a sub-pixel centre and a confidence
+# 5.  Searches the foreground blobs (see the camera background model) before the whole board
+
+import cv2
+import numpy as np
+
+# Full board search (the original Sphero search)
+SEARCH_MIN_RADIUS = 10  # Smallest Sphero radius (pixels of the maze image)
+SEARCH_MAX_RADIUS = 30  # Largest Sphero radius (pixels of the maze image)
+HOUGH_DP = 1.5  # Inverse accumulator resolution of the circle search
+HOUGH_MIN_DIST = 75  # Smallest distance between circles
+HOUGH_PARAM1 = 500  # Canny edge threshold of the circle search
+HOUGH_PARAM2 = 30  # Accumulator threshold of the circle search
+
+# Window search around the last known position
+TRACK_WINDOW = 45  # Half the size of the search window (pixels), beyond the Sphero radius
+TRACK_RADIUS_MARGIN = 4  # The window search looks for radii this close to the last radius found (pixels)
+TRACK_MAX_AGE = 0.5  # Seconds a position is used for; an older position does not predict where the Sphero is
+
+# Foreground search
+FOREGROUND_MAX_SIZE = 4 * SEARCH_MAX_RADIUS  # Larger foreground blobs (a hand, a wall being moved) are not searched
+
+# LED colour search
+LED_COLOR = (0, 0, 255)  # Sphero LED colour (red, green, blue) used by the LED search; blue stands out from the
+                         # green walls, red endpoint and white outer wall
+LED_HSV_MIN = (100, 100, 120)  # Smallest HSV values of the lit Sphero
+LED_HSV_MAX = (130, 255, 255)  # Largest HSV values of the lit Sphero
+LED_DOWNSCALE = 4  # The maze image is shrunk by this factor before the colour search
+LED_MIN_AREA = 6  # Smallest lit area counted as the Sphero (pixels of the shrunk image)
+
+# Sub-pixel centre and confidence
+REFINE_BAND = 0.3  # Edge points within this fraction of the radius of the circle found are fitted
+REFINE_INLIER = 1.5  # Edge points further than this from the first fit (pixels) are left out of the second
+REFINE_MIN_POINTS = 12  # Fewest edge points a circle is fitted to
+REFINE_MAX_SHIFT = 0.5  # The fit is not used if it moves the centre by more than this fraction of the radius
+REFINE_SECTORS = 36  # The confidence is the fraction of these sectors of the circle that have an edge on the circle
+
+# Where a detection came from
+DETECTION_FRESH = 'fresh'  # Found in the frame
+DETECTION_PREDICTED = 'predicted'  # Not found in the frame, predicted from the Sphero estimate
+DETECTION_STALE = 'stale'  # Not found and not predictable, the last position found
+
+# Several Spheros
+MULTI_MIN_DIST = 2 * SEARCH_MIN_RADIUS  # Smallest distance between circles; two Spheros can touch
+MULTI_MAX_JUMP = 80  # Furthest a Sphero can be found from where it should be (pixels)
+MULTI_HUE_TOLERANCE = 15  # Largest LED hue difference (OpenCV hue, 0 to 180) for a circle to be a Sphero's colour
+MULTI_MIN_SATURATION = 100  # Pixels less saturated than this are not lit by the LED
+MULTI_MIN_VALUE = 120  # Pixels darker than this are not lit by the LED
+MULTI_MIN_LIT = 0.1  # Fraction of a circle that must be lit for its colour to be measured
+MULTI_LED_RADIUS = 0.7  # Fraction of the circle radius the colour is measured in (the edge is shaded)
+
+
+#####################################################################
+# The purpose of this code is to find the Sphero without running the
+# circle search over the whole maze image on every frame.  The
+# Sphero moves only a few pixels between frames, so the search is run
+# on a small window around where it should be now (its last position
+# moved on by its last velocity), looking only for circles about the
+# size it was last seen at.  When the window search misses, the
+# foreground blobs (what differs from the camera's model of the empty
+# board) are searched, and the whole board only when that misses too.
+#
+# The LED search needs no circle search at all: the Sphero LED is
+# set to LED_COLOR and the ball is found as the largest patch of
+# that colour in a shrunk copy of the maze image.  Its centre is
+# then measured at full size from the colour patch, and how round the
+# patch is gives its confidence (a reflection is a smeared patch).
+#
+# To track several Spheros, one full board circle search finds all of
+# them and each circle is matched to a Sphero: by its LED colour if
+# the Spheros are lit in different colours, and by how close it is to
+# where each Sphero should be now.  A Sphero keeps its name from frame
+# to frame even when two are lit alike, as long as they do not swap
+# places between frames.
+#
+# A circle found is refined by fitting a circle to the edge points
+# around it, giving a sub-pixel centre; how much of the outline the
+# edges cover is its confidence.  A half hidden or blurred ball, or a
+# wall corner mistaken for one, scores low.
+#####################################################################
+
+# Result of looking for the Sphero in a frame.  Can be indexed like a circle from cv2.HoughCircles ([0] is x, [1] is y,
+# [2] is the radius) so it can be used where a circle was.
+class Sphero_Detection():
+    def __init__(self, x, y, radius, confidence, source, capture_time):
+        self.x = float(x)  # Centre (pixels of the maze image, sub-pixel)
+        self.y = float(y)
+        self.radius = float(radius)  # Radius (pixels)
+        self.confidence = float(confidence)  # 0 (no support) to 1 (the whole outline was seen)
+        self.source = source  # DETECTION_FRESH, DETECTION_PREDICTED or DETECTION_STALE
+        self.capture_time = capture_time  # Capture time of the frame the position is for (for a stale detection,
+                                          # of the frame it was last found in)
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.radius)[index]
+
+    def __len__(self):
+        return 3
+
+    def __repr__(self):
+        return "[{:.1f} {:.1f} {:.1f} {} {:.2f}]".format(self.x, self.y, self.radius, self.source, self.confidence)
+
+
+# Fits a circle to the edge points around a circle (x, y, radius) found in the grayscale maze image.  Returns the
+# refined (x, y, radius) and its confidence (0 to 1).
+def refine_circle(gray, circle):
+    x, y, radius = float(circle[0]), float(circle[1]), float(circle[2])
+    half = int(radius * (1 + REFINE_BAND)) + 2
+    x0, y0 = max(0, int(x) - half), max(0, int(y) - half)
+    edges = cv2.Canny(gray[y0:int(y) + half + 1, x0:int(x) + half + 1], HOUGH_PARAM1 // 2, HOUGH_PARAM1)
+    ys, xs = np.nonzero(edges)
+    xs = xs + (x0 - x)  # Relative to the circle found
+    ys = ys + (y0 - y)
+    near = np.abs(np.hypot(xs, ys) - radius) < radius * REFINE_BAND
+    xs, ys = xs[near], ys[near]
+
+    fit = (0.0, 0.0, radius)
+    if len(xs) >= REFINE_MIN_POINTS:
+        fit = _fit_circle(xs, ys)
+        inliers = np.abs(np.hypot(xs - fit[0], ys - fit[1]) - fit[2]) < REFINE_INLIER
+        if np.count_nonzero(inliers) >= REFINE_MIN_POINTS:
+            fit = _fit_circle(xs[inliers], ys[inliers])
+        if np.hypot(fit[0], fit[1]) > radius * REFINE_MAX_SHIFT or \
+                not SEARCH_MIN_RADIUS * 0.5 <= fit[2] <= SEARCH_MAX_RADIUS * 1.5:
+            fit = (0.0, 0.0, radius)  # Fitted to something else, keep the circle found
+
+    # Sectors of the fitted circle with an edge point on it
+    on_circle = np.abs(np.hypot(xs - fit[0], ys - fit[1]) - fit[2]) < REFINE_INLIER
+    angles = np.arctan2(ys[on_circle] - fit[1], xs[on_circle] - fit[0])
+    sectors = np.unique(((angles + np.pi) * (REFINE_SECTORS / (2 * np.pi))).astype(int) % REFINE_SECTORS)
+    return (x + fit[0], y + fit[1], fit[2]), len(sectors) / float(REFINE_SECTORS)
+
+
+# Least squares circle (x, y, radius) through points
+def _fit_circle(xs, ys):
+    a = np.column_stack((2 * xs, 2 * ys, np.ones(len(xs))))
+    (cx, cy, c), residuals, rank, singular = np.linalg.lstsq(a, xs ** 2 + ys ** 2, rcond=None)
+    return cx, cy, np.sqrt(max(0.0, c + cx ** 2 + cy ** 2))
+
+
+# Where a Sphero was last found and how fast it was moving, shared by Sphero_Tracker and Multi_Sphero_Tracker
+class Sphero_Motion():
+    def __init__(self):
+        self.position = None  # Last circle found (x, y, radius)
+        self.position_time = 0  # Capture time of the frame the last circle was found in
+        self.velocity = (0.0, 0.0)  # Velocity (pixels per second) between the last two circles found
+
+    # Returns where the Sphero should be at time t (x, y), or None if it has not been seen recently
+    def predict(self, t):
+        if self.position is None:
+            return
+        age = t - self.position_time
+        if age > TRACK_MAX_AGE or age < 0:
+            return
+        return self.position[0] + self.velocity[0] * age, self.position[1] + self.velocity[1] * age
+
+    # Remembers a circle found at time t
+    def update(self, circle, t):
+        if self.position is not None and 0 < t - self.position_time <= TRACK_MAX_AGE:
+            dt = t - self.position_time
+            self.velocity = ((circle[0] - self.position[0]) / dt, (circle[1] - self.position[1]) / dt)
+        else:
+            self.velocity = (0.0, 0.0)
+        self.position = (float(circle[0]), float(circle[1]), float(circle[2]))
+        self.position_time = t
+
+    # Forgets the last position
+    def reset(self):
+        self.position = None
+        self.velocity = (0.0, 0.0)
+
+
+class Sphero_Tracker():
+    def __init__(self):
+        self.motion = Sphero_Motion()  # Last Sphero circle found and its velocity
+        self.fast = 0  # Number of searches answered by the window search
+        self.foreground = 0  # Number of searches answered by the foreground search
+        self.fallback = 0  # Number of searches that needed the full board search
+        self.misses = 0  # Number of searches that found no Sphero at all
+
+    # Returns the circles found in a frame context, in the format of cv2.HoughCircles (None if there are none).
+    # The window search is tried first, then the foreground blobs, then the full board.
+    def find(self, frame):
+        gray = frame.gray()
+        circles = self.__window_search(gray, frame.capture_time)
+        if circles is not None:
+            self.fast += 1
+        else:
+            circles = self.__foreground_search(gray, frame.foreground_blobs())
+            if circles is not None:
+                self.foreground += 1
+        if circles is None:
+            circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, HOUGH_DP, HOUGH_MIN_DIST, param1=HOUGH_PARAM1,
+                                       param2=HOUGH_PARAM2, minRadius=SEARCH_MIN_RADIUS, maxRadius=SEARCH_MAX_RADIUS)
+            self.fallback += 1
+            if circles is None or len(circles[0]) != 1:
+                self.misses += 1
+
+        if circles is not None and len(circles[0]) == 1:
+            self.motion.update(circles[0][0], frame.capture_time)
+        return circles
+
+    # Returns where the Sphero should be at time t (x, y), or None if it has not been seen recently
+    def predict(self, t):
+        return self.motion.predict(t)
+
+    # Searches the window around the predicted position; returns the circle found (HoughCircles format) or None
+    def __window_search(self, gray, t):
+        predicted = self.predict(t)
+        if predicted is None:
+            return
+        radius = self.motion.position[2]
+        half = int(TRACK_WINDOW + radius + TRACK_RADIUS_MARGIN)
+        x0 = max(0, int(predicted[0]) - half)
+        y0 = max(0, int(predicted[1]) - half)
+        x1 = min(gray.shape[1], int(predicted[0]) + half)
+        y1 = min(gray.shape[0], int(predicted[1]) + half)
+        if x1 - x0 < 2 * radius or y1 - y0 < 2 * radius:
+            return  # Predicted off the board
+
+        circles = cv2.HoughCircles(gray[y0:y1, x0:x1], cv2.HOUGH_GRADIENT, HOUGH_DP, HOUGH_MIN_DIST,
+                                   param1=HOUGH_PARAM1, param2=HOUGH_PARAM2,
+                                   minRadius=max(SEARCH_MIN_RADIUS, int(radius) - TRACK_RADIUS_MARGIN),
+                                   maxRadius=min(SEARCH_MAX_RADIUS, int(radius) + TRACK_RADIUS_MARGIN))
+        if circles is None or len(circles[0]) != 1:
+            return
+        circles[0][0][0] += x0  # Window to maze image coordinates
+        circles[0][0][1] += y0
+        return circles
+
+    # Searches the foreground blobs (x, y, width, height) small enough to be the Sphero; returns the circle found
+    # (HoughCircles format) if exactly one blob holds exactly one circle, otherwise None
+    def __foreground_search(self, gray, blobs):
+        if not blobs:
+            return  # No background model yet, or nothing moved
+        found = []
+        for x, y, width, height in blobs:
+            if width > FOREGROUND_MAX_SIZE or height > FOREGROUND_MAX_SIZE:
+                continue
+            if width < SEARCH_MIN_RADIUS or height < SEARCH_MIN_RADIUS:
+                continue  # Too small to hold a whole Sphero
+            margin = SEARCH_MAX_RADIUS // 2  # The ball edge can be close to the board's grey level
+            x0, y0 = max(0, x - margin), max(0, y - margin)
+            x1, y1 = min(gray.shape[1], x + width + margin), min(gray.shape[0], y + height + margin)
+            circles = cv2.HoughCircles(gray[y0:y1, x0:x1], cv2.HOUGH_GRADIENT, HOUGH_DP, HOUGH_MIN_DIST,
+                                       param1=HOUGH_PARAM1, param2=HOUGH_PARAM2, minRadius=SEARCH_MIN_RADIUS,
+                                       maxRadius=SEARCH_MAX_RADIUS)
+            if circles is not None:
+                for circle in circles[0]:
+                    found.append((circle[0] + x0, circle[1] + y0, circle[2]))  # Blob to maze image coordinates
+        if len(found) != 1:
+            return
+        return np.array([found], np.float32)
+
+    # Forgets the last position, the next search is over the whole board
+    def reset(self):
+        self.motion.reset()
+
+    # Returns a dictionary of how often each search was used
+    def stats(self):
+        searches = self.fast + self.foreground + self.fallback
+        return {'searches': searches, 'fast': self.fast, 'foreground': self.foreground, 'fallback': self.fallback,
+                'misses': self.misses, 'fast_fraction': self.fast / float(searches) if searches else 0.0}
+
+    def print_report(self):
+        stats = self.stats()
+        print("Sphero Tracker: {} searches, {} window ({:.0%}), {} foreground, {} full board, {} not found".format(
+            stats['searches'], stats['fast'], stats['fast_fraction'], stats['foreground'], stats['fallback'],
+            stats['misses']))
+
+
+# Finds the Sphero by the colour of its LED (the Sphero must be lit with LED_COLOR).  Has the same interface as
+# Sphero_Tracker.
+class LED_Detector():
+    def __init__(self):
+        self.found = 0  # Number of searches that found the Sphero
+        self.misses = 0  # Number of searches that found no Sphero
+        self.confidence = 0.0  # Confidence (0 to 1) of the last circle found, how round its lit patch is
+        self.__hsv_min = np.array(LED_HSV_MIN, np.uint8)
+        self.__hsv_max = np.array(LED_HSV_MAX, np.uint8)
+
+    # Returns the circle found in a frame context, in the format of cv2.HoughCircles (None if there is none).  Only the
+    # largest lit patch is returned (smaller ones are reflections), as a circle with the radius of a disc of its area.
+    def find(self, frame):
+        img = frame.image()
+        # Every LED_DOWNSCALE'th pixel is enough to find the patch (and much cheaper than averaging)
+        small = cv2.resize(img, (img.shape[1] // LED_DOWNSCALE, img.shape[0] // LED_DOWNSCALE),
+                           interpolation=cv2.INTER_NEAREST)
+        lit = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), self.__hsv_min, self.__hsv_max)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(lit)
+
+        largest = np.argmax(stats[1:, cv2.CC_STAT_AREA]) + 1 if count > 1 else None  # Label 0 is the background
+        if largest is None or stats[largest, cv2.CC_STAT_AREA] < LED_MIN_AREA:
+            self.misses += 1
+            return
+        self.found += 1
+        x, y, radius, self.confidence = self.__measure(img, stats[largest])
+        return np.array([[(x, y, radius)]], np.float32)
+
+    # Returns the circle (x, y, radius) of a lit patch and its confidence, measured in the full size image around the
+    # patch found in the shrunk image.  The confidence is the patch area over the area of a disc with the same spread
+    # (second moments) around its centre: 1 for a round patch, less for a smeared or scattered one.
+    def __measure(self, img, stat):
+        x0 = max(0, (stat[cv2.CC_STAT_LEFT] - 1) * LED_DOWNSCALE)
+        y0 = max(0, (stat[cv2.CC_STAT_TOP] - 1) * LED_DOWNSCALE)
+        x1 = min(img.shape[1], (stat[cv2.CC_STAT_LEFT] + stat[cv2.CC_STAT_WIDTH] + 1) * LED_DOWNSCALE)
+        y1 = min(img.shape[0], (stat[cv2.CC_STAT_TOP] + stat[cv2.CC_STAT_HEIGHT] + 1) * LED_DOWNSCALE)
+        lit = cv2.inRange(cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2HSV), self.__hsv_min, self.__hsv_max)
+        moments = cv2.moments(lit, True)
+        if moments['m00'] == 0:
+            # Lost in the full size image, use the shrunk image measurement
+            return (x0 + (x1 - x0) / 2.0, y0 + (y1 - y0) / 2.0,
+                    np.sqrt(stat[cv2.CC_STAT_AREA] / np.pi) * LED_DOWNSCALE, 0.0)
+        spread = 2 * np.pi * (moments['mu20'] + moments['mu02'])  # pi r^2 times the area, for a disc of radius r
+        confidence = min(1.0, moments['m00'] ** 2 / spread) if spread > 0 else 0.0
+        return (x0 + moments['m10'] / moments['m00'], y0 + moments['m01'] / moments['m00'],
+                np.sqrt(moments['m00'] / np.pi), confidence)
+
+    def reset(self):
+        pass
+
+    # Returns a dictionary of how often the Sphero was found
+    def stats(self):
+        return {'searches': self.found + self.misses, 'found': self.found, 'misses': self.misses}
+
+    def print_report(self):
+        stats = self.stats()
+        print("LED Detector: {} searches, {} not found".format(stats['searches'], stats['misses']))
+
+
+# One Sphero followed by Multi_Sphero_Tracker
+class Sphero_Track():
+    def __init__(self, name, color=None):
+        self.name = name
+        self.hue = None  # LED hue (OpenCV hue) or None if its colour is not known
+        if color is not None:
+            red, green, blue = color
+            self.hue = int(cv2.cvtColor(np.uint8([[[blue, green, red]]]), cv2.COLOR_BGR2HSV)[0, 0, 0])
+        self.motion = Sphero_Motion()  # Last circle found and its velocity
+        self.found = 0  # Number of frames the Sphero was found in
+        self.misses = 0  # Number of frames the Sphero was not found in
+
+    # Remembers a circle found at time t
+    def update(self, circle, t):
+        self.motion.update(circle, t)
+        self.found += 1
+
+
+# Tracks several Spheros with one circle search per frame.  Spheros are added by name, with the colour their LED is
+# set to (None if unlit).
+class Multi_Sphero_Tracker():
+    def __init__(self):
+        self.spheros = {}  # Sphero_Track by name, in the order added
+        self.unmatched = 0  # Number of circles found that matched no Sphero
+
+    def add_sphero(self, name, color=None):
+        self.spheros[name] = Sphero_Track(name, color)
+
+    def remove_sphero(self, name):
+        self.spheros.pop(name, None)
+
+    # Finds the Spheros in a frame context.  Returns a dictionary of the circles (x, y, radius) found by Sphero name;
+    # Spheros not found are left out.
+    def find(self, frame):
+        circles = cv2.HoughCircles(frame.gray(), cv2.HOUGH_GRADIENT, HOUGH_DP, MULTI_MIN_DIST, param1=HOUGH_PARAM1,
+                                   param2=HOUGH_PARAM2, minRadius=SEARCH_MIN_RADIUS, maxRadius=SEARCH_MAX_RADIUS)
+        circles = [] if circles is None else [tuple(float(v) for v in c) for c in circles[0]]
+        img = frame.image()
+        hues = [self.__measure_hue(img, c) for c in circles]
+        t = frame.capture_time
+
+        # Every Sphero / circle pair that could match, cheapest first
+        pairs = []
+        for name, sphero in self.spheros.items():
+            predicted = sphero.motion.predict(t)
+            for i, circle in enumerate(circles):
+                cost = self.__match_cost(sphero, predicted, circle, hues[i])
+                if cost is not None:
+                    pairs.append((cost, name, i))
+        pairs.sort()
+
+        found = {}
+        used = set()
+        for cost, name, i in pairs:
+            if name in found or i in used:
+                continue
+            found[name] = circles[i]
+            used.add(i)
+            self.spheros[name].update(circles[i], t)
+        for name, sphero in self.spheros.items():
+            if name not in found:
+                sphero.misses += 1
+        self.unmatched += len(circles) - len(used)
+        return found
+
+    # Returns how badly a circle (with LED hue, or None if unlit) matches a Sphero, or None if it cannot be that
+    # Sphero.  Each of colour and distance from the predicted position adds 0 (perfect) to 1 (at the limit); an
+    # unknown colour or position adds 1.
+    def __match_cost(self, sphero, predicted, circle, hue):
+        cost = 0.0
+        if sphero.hue is not None and hue is not None:
+            difference = abs(sphero.hue - hue)
+            difference = min(difference, 180 - difference)  # Hue wraps around
+            if difference > MULTI_HUE_TOLERANCE:
+                return
+            cost += difference / float(MULTI_HUE_TOLERANCE)
+        else:
+            cost += 1.0  # Colour unknown: the Sphero or the circle is unlit (or the LED is hidden)
+        if predicted is not None:
+            distance = np.hypot(circle[0] - predicted[0], circle[1] - predicted[1])
+            if distance > MULTI_MAX_JUMP:
+                return
+            cost += distance / MULTI_MAX_JUMP
+        else:
+            cost += 1.0
+        return cost
+
+    # Returns the LED hue (OpenCV hue) of a circle in the maze image, or None if it is not lit
+    def __measure_hue(self, img, circle):
+        radius = max(1, int(circle[2] * MULTI_LED_RADIUS))
+        x, y = int(round(circle[0])), int(round(circle[1]))
+        x0, y0 = max(0, x - radius), max(0, y - radius)
+        patch = img[y0:y + radius + 1, x0:x + radius + 1]
+        if patch.size == 0:
+            return
+        disc = np.zeros(patch.shape[:2], np.uint8)
+        cv2.circle(disc, (x - x0, y - y0), radius, 255, -1)
+        hsv = cv2.cvtColor(patch, cv2.COLOR_BGR2HSV)
+        lit = (disc > 0) & (hsv[:, :, 1] >= MULTI_MIN_SATURATION) & (hsv[:, :, 2] >= MULTI_MIN_VALUE)
+        if np.count_nonzero(lit) < MULTI_MIN_LIT * np.count_nonzero(disc):
+            return
+        # Average of the hue angles (hue wraps around at 180)
+        angles = hsv[:, :, 0][lit].astype(np.float64) * (np.pi / 90.0)
+        hue = np.arctan2(np.sin(angles).mean(), np.cos(angles).mean()) * (90.0 / np.pi)
+        return int(round(hue)) % 180
+
+    # Returns a dictionary of where each Sphero should be at time t (x, y) by name; Spheros not seen recently are
+    # left out
+    def positions(self, t):
+        positions = {}
+        for name, sphero in self.spheros.items():
+            predicted = sphero.motion.predict(t)
+            if predicted is not None:
+                positions[name] = predicted
+        return positions
+
+    # Forgets where the Spheros were, keeping their names and colours
+    def reset(self):
+        for sphero in self.spheros.values():
+            sphero.motion.reset()
+
+    # Returns a dictionary of how often each Sphero was found, by name
+    def stats(self):
+        return {name: {'found': sphero.found, 'misses': sphero.misses} for name, sphero in self.spheros.items()}
+
+    def print_report(self):
+        for name, counts in self.stats().items():
+            print("Multi Sphero Tracker: {} found in {} frames, not found in {}".format(
+                name, counts['found'], counts['misses']))
+        print("Multi Sphero Tracker: {} circles matched no Sphero".format(self.unmatched))